@@ -1,4 +1,5 @@
 import bpy
+from .frame_dispatcher import FRAME_DISPATCHER
 
 # ----------------------- NEURON BUILDER UI -----------------------
 
@@ -14,17 +15,53 @@ class BLENDERSPIKY_PT_NeuronBuilder(bpy.types.Panel):
         props = context.scene.blenderspiky_neuronbuild
         col = layout.column()
         col.prop(props, "filepath")
+        col.prop(props, "voltage_storage")
+        col.operator("blenderspiky.convert_recording", icon="FILE_REFRESH")
         col.label(text="Coordinates", icon="GRID")
         col.prop(props, "center_at_origin")
         col.prop(props, "downscale_factor")
 
         col.separator()
         col.label(text="Morphology", icon="MESH_UVSPHERE")
+        col.prop(props, "mesh_method", text="")
+        if props.mesh_method == 'NUMPY':
+            col.prop(props, "ring_resolution")
+        row = col.row()
+        row.enabled = props.mesh_method == 'NUMPY' # Only generated meshes have levels of detail
+        row.prop(props, "use_lod")
+        if props.mesh_method == 'NUMPY' and props.use_lod:
+            col.prop(props, "viewport_resolution")
+            col.prop(props, "min_ring_resolution")
+            col.prop(props, "camera_lod")
         col.prop(props, "segmentation")
         col.prop(props, "branch_base_thickness")
         col.prop(props, "branch_thickness_homogeneity")
         col.prop(props, "simplify_soma")
         col.prop(props, "with_caps")
+        col.prop(props, "merge_sections")
+
+        col.separator()
+        col.label(text="Playback", icon="PLAY")
+        col.prop(props, "voltage_mode", text="")
+        sub = col.column()
+        sub.enabled = props.voltage_mode == 'HANDLER'
+        sub.prop(props, "precompute_frames")
+        sub = sub.column()
+        sub.enabled = props.precompute_frames
+        sub.prop(props, "frame_budget")
+        sub = col.column()
+        sub.enabled = props.voltage_mode == 'HANDLER'
+        sub.prop(props, "skip_unchanged")
+        sub = sub.column()
+        sub.enabled = props.skip_unchanged
+        sub.prop(props, "update_tolerance")
+        sub = col.column()
+        sub.enabled = props.voltage_mode == 'HANDLER'
+        sub.prop(props, "cull_offscreen")
+        sub = sub.column()
+        sub.enabled = props.cull_offscreen
+        sub.prop(props, "cull_min_pixels")
+        sub.prop(props, "cull_margin")
         
     
 
@@ -44,18 +81,25 @@ class BLENDERSPIKY_PT_GraphBuilder(bpy.types.Panel):
         layout = self.layout
         props = context.scene.blenderspiky_graphbuild
         
-        #Mode specific UI (matplotlib textures or Blender native)
-        # row = layout.row()
-        # row.prop(props, "plot_mode", expand=True)
-
-        # Create an inset for the lower section
-        # if props.plot_mode == 'MPL':
-        #     col.prop(props, "animation_folder")
-        # elif props.plot_mode == 'Native':
-        #     col.prop(props, "animate")
+        #Mode specific UI (rasterised textures or Blender native curves)
+        row = layout.row()
+        row.prop(props, "plot_mode", expand=True)
             
         col = layout.column(align=True)
+        if props.plot_mode == 'Texture':
+            col.prop(props, "texture_resolution")
+        elif props.plot_mode == 'Native':
+            col.prop(props, "animate")
         col.operator("blenderspiky.build_graph", icon='GRAPH')
+        col.operator("blenderspiky.build_graphs", icon='GRAPH')
+        row = col.row(align=True)
+        row.prop(props, "batch_type")
+        row.prop(props, "batch_IDs")
+        col.operator("blenderspiky.build_raster", icon='ALIGN_JUSTIFY')
+        row = col.row(align=True)
+        row.prop(props, "spike_threshold")
+        row.prop(props, "spike_refractory")
+        col.prop(props, "raster_row_height")
         row = col.row(align=True)
         row.scale_x = 1.5
         row.prop(props, "line_width")
@@ -63,6 +107,9 @@ class BLENDERSPIKY_PT_GraphBuilder(bpy.types.Panel):
         row.prop(props, "graph_color")
         col.prop(props, "t_scalar")
         col.prop(props, "v_scalar")
+        row = col.row(align=True)
+        row.prop(props, "graph_resolution")
+        row.prop(props, "max_graph_points")
         
         col = layout.column(align=True)
         if props.scale_bars:
@@ -127,8 +174,23 @@ class BLENDERSPIKY_PT_AnimationManager(bpy.types.Panel):
         row = layout.row()
         row.operator("blenderspiky.reload_animations") 
 
+        ob = context.object
+        if ob is not None and "animate" in ob:
+            row = layout.row()
+            row.prop(ob, '["animate"]', text="Animate {}".format(ob.name))
+
+        row = layout.row()
+        row.prop(context.scene.blenderspiky_neuronbuild, "cache_budget")
+
+        if FRAME_DISPATCHER.total_sections:
+            row = layout.row()
+            row.label(text="Skipped sections: {} / {}".format(FRAME_DISPATCHER.skipped_sections,
+                                                             FRAME_DISPATCHER.total_sections))
+
         row = layout.row()
         row.operator("blenderspiky.remove_handlers")
+        row = layout.row()
+        row.operator("blenderspiky.remove_all_handlers")
 
 # ----------------------- SHADING UI ------------------------------
 
@@ -145,6 +207,12 @@ class BLENDERSPIKY_PT_MaterialCreator(bpy.types.Panel):
         col = layout.column()
         col.prop(props, "min_value")
         col.prop(props, "max_value")
+        col.operator("blenderspiky.auto_range")
+        ob = context.object
+        if ob is not None and ob.get("quantisation_error"): # Compact voltage storage of the active neuron
+            colour_range = max(abs(props.max_value - props.min_value), 1e-12)
+            col.label(text="Storage error <= {:.3g} mV ({:.3g}% of range)".format(
+                ob["quantisation_error"], 100*ob["quantisation_error"]/colour_range))
         col.prop(props, "colormap")
         col.prop(props, "cmap_start")
         col.prop(props, "cmap_end")
@@ -42,9 +42,15 @@ def check_and_install_modules():
 
 check_and_install_modules() # This is called before any imports from the submodules
 
+#frame_dispatcher
+from .frame_dispatcher import FRAME_DISPATCHER, clear_on_load
+
 #graph_builder
 from .graph_builder import GraphBuilderProps
+from .graph_builder import GRAPH_UPDATES, clear_graph_caches
 from .graph_builder import BLENDERSPIKY_OT_GraphBuilder
+from .graph_builder import BLENDERSPIKY_OT_BatchGraphBuilder
+from .graph_builder import BLENDERSPIKY_OT_RasterBuilder
 from .graph_builder import BLENDERSPIKY_OT_GraphRemover
 from .graph_builder import BLENDERSPIKY_OT_ScalebarBuilder
 from .graph_builder import BLENDERSPIKY_OT_ScalebarRemover
@@ -55,15 +61,19 @@ from .graph_builder import BLENDERSPIKY_OT_ReferenceRemover
 
 #neuron_builder
 from .neuron_builder import NeuronBuilderProps
+from .neuron_builder import sync_cache_budget
 from .neuron_builder import BLENDERSPIKY_OT_NeuronBuilder
+from .neuron_builder import BLENDERSPIKY_OT_RecordingConverter
 
 #animation_manager
 from .animation_manager import BLENDERSPIKY_OT_HandlerRemover
+from .animation_manager import BLENDERSPIKY_OT_AllHandlersRemover
 from .animation_manager import BLENDERSPIKY_OT_AnimationLoader
 
 #materials
 from .materials import VoltageMaterialProps
 from .materials import BLENDERSPIKY_OT_MaterialCreator
+from .materials import BLENDERSPIKY_OT_AutoRange
 from .materials import BLENDERSPIKY_OT_RemoveMatertials
 from .materials import BLENDERSPIKY_OT_SetupWorld
 
@@ -81,9 +91,13 @@ ordered_classes = [
 
     # Operators
     BLENDERSPIKY_OT_NeuronBuilder,
+    BLENDERSPIKY_OT_RecordingConverter,
     BLENDERSPIKY_OT_HandlerRemover,
+    BLENDERSPIKY_OT_AllHandlersRemover,
     
     BLENDERSPIKY_OT_GraphBuilder,
+    BLENDERSPIKY_OT_BatchGraphBuilder,
+    BLENDERSPIKY_OT_RasterBuilder,
     BLENDERSPIKY_OT_GraphRemover,
     BLENDERSPIKY_OT_ScalebarBuilder,
     BLENDERSPIKY_OT_ScalebarRemover,
@@ -93,6 +107,7 @@ ordered_classes = [
     BLENDERSPIKY_OT_ReferenceRemover,
     
     BLENDERSPIKY_OT_MaterialCreator,
+    BLENDERSPIKY_OT_AutoRange,
     BLENDERSPIKY_OT_RemoveMatertials,
     
     BLENDERSPIKY_OT_AnimationLoader,
@@ -114,7 +129,20 @@ def register():
     bpy.types.Scene.blenderspiky_graphbuild = bpy.props.PointerProperty(type = GraphBuilderProps)
     bpy.types.Scene.blenderspiky_materials = bpy.props.PointerProperty(type = VoltageMaterialProps)
 
+    bpy.app.handlers.load_pre.append(clear_on_load)
+    bpy.app.handlers.load_pre.append(clear_graph_caches)
+    bpy.app.handlers.load_post.append(sync_cache_budget)
+
 def unregister():
+    FRAME_DISPATCHER.clear() # Detach the frame handlers of the add-on
+    GRAPH_UPDATES.cancel()
+    if clear_on_load in bpy.app.handlers.load_pre:
+        bpy.app.handlers.load_pre.remove(clear_on_load)
+    if clear_graph_caches in bpy.app.handlers.load_pre:
+        bpy.app.handlers.load_pre.remove(clear_graph_caches)
+    if sync_cache_budget in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(sync_cache_budget)
+
     for cl in reversed(ordered_classes):
         bpy.utils.unregister_class(cl)
         
@@ -1,18 +1,24 @@
 import bpy
 from .neuron_builder import BlenderNeuron
+from .frame_dispatcher import FRAME_DISPATCHER
 
 class BLENDERSPIKY_OT_HandlerRemover(bpy.types.Operator):   
-    '''
-    Operator to clear frame_change_post handers.
-
-    Note: this should remove a handler linked to a selected object, but I don't know how to implement this. 
-    So, as a temporary band aid, it just removes all handlers. 
-    '''
+    '''Stop animating the selected neurons and free their cached data'''
     bl_idname = 'blenderspiky.remove_handlers'
+    bl_label =  'Remove voltage handlers of selected'
+
+    def execute(self, context):
+        removed = [ob.name for ob in context.selected_objects if FRAME_DISPATCHER.remove(ob)]
+        self.report({"INFO"}, "Removed voltage handlers of: {}".format(", ".join(removed) or "none"))
+        return {"FINISHED"}
+
+class BLENDERSPIKY_OT_AllHandlersRemover(bpy.types.Operator):   
+    '''Stop animating all neurons'''
+    bl_idname = 'blenderspiky.remove_all_handlers'
     bl_label =  'Remove all voltage handlers'
 
     def execute(self, context):
-        bpy.app.handlers.frame_change_post.clear()
+        FRAME_DISPATCHER.clear()
         return {"FINISHED"}
     
 class BLENDERSPIKY_OT_AnimationLoader(bpy.types.Operator):   
@@ -26,6 +32,8 @@ class BLENDERSPIKY_OT_AnimationLoader(bpy.types.Operator):
             The operator reinstantiates BlenderNeuron and nested BlenderSection objects from the metadata of selected object
         '''
         for ob in context.selected_objects:
+            if ob.get("voltage_mode") == "ATLAS": # Animated by the material, there is no handler to reload
+                continue
             neuron = BlenderNeuron(
                     filepath=ob["filepath"],
                     with_caps=bool(ob["with_caps"]),
@@ -34,9 +42,22 @@ class BLENDERSPIKY_OT_AnimationLoader(bpy.types.Operator):
                     parent_ob=ob,
                     DOWNSCALE_FACTOR=ob["DOWNSCALE_FACTOR"],
                     branch_base_thickness=ob["branch_base_thickness"],
-                    branch_thickness_homogeneity = ob["branch_thickness_homogeneity"]
+                    branch_thickness_homogeneity = ob["branch_thickness_homogeneity"],
+                    merge_sections=bool(ob.get("merge_sections", False)),
+                    mesh_method=ob.get("mesh_method", "NUMPY"),
+                    use_lod=bool(ob.get("use_lod", False)),
+                    precompute_frames=bool(ob.get("precompute_frames", False)),
+                    skip_unchanged=bool(ob.get("skip_unchanged", False)),
+                    update_tolerance=ob.get("update_tolerance", 0.1),
+                    voltage_storage=ob.get("voltage_storage", "FLOAT32"),
+                    cull_offscreen=bool(ob.get("cull_offscreen", False)),
+                    cull_min_pixels=ob.get("cull_min_pixels", 1.0),
+                    cull_margin=ob.get("cull_margin", 0.1),
+                    frame_budget=ob.get("frame_budget", 512)
                 )
                 
             neuron.reinstantiate_sections_from_childen()
+            if neuron.precompute_frames:
+                neuron.precompute_frame_buffer(neuron.frame_budget)
             neuron.add_voltage_handler()
         return {"FINISHED"}
\ No newline at end of file
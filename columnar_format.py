@@ -0,0 +1,129 @@
+'''
+    Columnar on-disk format for NEURON recordings (.bspk)
+
+    MAGIC | uint64 header length | JSON header | arrays (each aligned to ALIGNMENT bytes)
+
+    The header lists the section types, the recording shape and, for every array, its dtype, shape and offset.
+    Arrays:
+        point_offsets (Nsections+1,) - start of each section in X, Y, Z, DIAM
+        X, Y, Z, DIAM (Npoints,) - morphology of all sections, concatenated
+        segment_offsets (Nsections+1,) - start of each section in a voltage row
+        voltage (Nframes, Nsegments) - one contiguous row per frame, memory mapped when read.
+                                       float32, float16, or int16 with voltage_scale and voltage_offset (Nsections,)
+        section_means (Nsections, Nframes) float32 - mean voltage of each section, computed while converting
+'''
+import json
+import pickle
+import numpy as np
+from .quantisation import int16_parameters, encode
+
+MAGIC = b"BSPKCOL1"
+ALIGNMENT = 64
+EXTENSION = ".bspk"
+
+def is_columnar(path):
+    return str(path).lower().endswith(EXTENSION)
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+def write_columnar(path, sections_dicts, storage="FLOAT32"):
+    '''
+        Write a list of section dicts (as exported from NEURON) in the columnar format.
+        Voltages are written frame by frame, so only one row is held in memory on top of the input.
+            storage - "FLOAT32", "FLOAT16" or "INT16" (see quantisation)
+    '''
+    n_sections = len(sections_dicts)
+    n_frames = len(sections_dicts[0]["Voltage"])
+    n_points = [len(sec["X"]) for sec in sections_dicts]
+    n_segments = [len(sec["Voltage"][0]) for sec in sections_dicts]
+    point_offsets = np.concatenate([[0], np.cumsum(n_points)]).astype(np.int64)
+    segment_offsets = np.concatenate([[0], np.cumsum(n_segments)]).astype(np.int64)
+
+    morphology = {coord: np.concatenate([np.asarray(sec[coord], dtype=np.float32).reshape(-1) for sec in sections_dicts])
+                  for coord in ["X", "Y", "Z", "DIAM"]}
+    small_arrays = {"point_offsets": point_offsets, "segment_offsets": segment_offsets, **morphology}
+    column_scale, column_offset = 1, 0
+    if storage == "INT16":
+        minima = [np.min(sec["Voltage"]) for sec in sections_dicts]
+        maxima = [np.max(sec["Voltage"]) for sec in sections_dicts]
+        small_arrays["voltage_scale"], small_arrays["voltage_offset"] = int16_parameters(minima, maxima)
+        column_scale = np.repeat(small_arrays["voltage_scale"], n_segments)
+        column_offset = np.repeat(small_arrays["voltage_offset"], n_segments)
+    voltage_dtype = encode(0, storage, 1, 0).dtype
+    shapes = {name: (array.dtype.str, array.shape) for name,array in small_arrays.items()}
+    shapes["voltage"] = (voltage_dtype.str, (n_frames, int(segment_offsets[-1])))
+    shapes["section_means"] = (np.dtype(np.float32).str, (n_sections, n_frames))
+
+    # Header with array offsets (relative to the start of the data block)
+    arrays, offset = {}, 0
+    for name,(dtype,shape) in shapes.items():
+        offset = _aligned(offset)
+        arrays[name] = {"dtype": dtype, "shape": list(shape), "offset": offset}
+        offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+    header = json.dumps({
+        "n_sections": n_sections,
+        "n_frames": n_frames,
+        "types": [sec["type"] for sec in sections_dicts],
+        "storage": storage,
+        "arrays": arrays,
+    }).encode()
+    data_start = _aligned(len(MAGIC) + 8 + len(header))
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(header)).tobytes())
+        f.write(header)
+
+        def seek(name):
+            f.seek(data_start + arrays[name]["offset"])
+
+        for name,array in small_arrays.items():
+            seek(name)
+            f.write(np.ascontiguousarray(array).tobytes())
+
+        seek("voltage")
+        counts = np.diff(segment_offsets)
+        section_means = np.empty((n_sections, n_frames), dtype=np.float32)
+        for frame in range(n_frames):
+            row = np.concatenate([np.asarray(sec["Voltage"][frame], dtype=np.float32) for sec in sections_dicts])
+            section_means[:, frame] = np.add.reduceat(row, segment_offsets[:-1]) / counts
+            f.write(encode(row, storage, column_scale, column_offset).tobytes())
+
+        seek("section_means")
+        f.write(section_means.tobytes())
+    return path
+
+def convert_pickle(source_path, target_path=None, storage="FLOAT32"):
+    '''
+        Convert a NEURON .pickle (list of section dicts) to the columnar format. Returns the path of the new file
+    '''
+    if target_path is None:
+        target_path = str(source_path).rsplit(".", 1)[0] + EXTENSION
+    with open(source_path, "rb") as f:
+        sections_dicts = pickle.load(f)
+    return write_columnar(target_path, sections_dicts, storage)
+
+## ------------------------------ Columnar recording reader ----------------------------------
+
+class ColumnarRecording():
+    '''
+        Reader of the columnar format. Every array is memory mapped, so only the frames that are
+        actually read are loaded from disk.
+    '''
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError("{} is not a columnar NEURON recording".format(path))
+            header_length = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+            header = json.loads(f.read(header_length))
+        data_start = _aligned(len(MAGIC) + 8 + header_length)
+
+        self.n_sections = header["n_sections"]
+        self.n_frames = header["n_frames"]
+        self.types = header["types"]
+        for name,spec in header["arrays"].items():
+            array = np.memmap(path, dtype=np.dtype(spec["dtype"]), mode="r",
+                              offset=data_start + spec["offset"], shape=tuple(spec["shape"]))
+            setattr(self, name, array)
@@ -0,0 +1,52 @@
+'''
+    Camera frustum and screen-size culling of sections (NumPy only).
+
+    Sections are tested by their bounding boxes, transformed into camera space (the camera looks along -Z).
+    A box is culled when all its corners are on the outer side of one frustum plane, or when it covers
+    fewer pixels than a threshold. Tests are conservative: the frustum is widened by a margin.
+'''
+import numpy as np
+
+def section_bounds(morphology, radius_factor=1.0):
+    '''
+        (Nsections, 2, 3) axis aligned bounding boxes (min, max corner) of resampled sections.
+            morphology - (Nsections, [X,Y,Z,DIAM], segmentation)
+            radius_factor - ratio of the mesh radius to DIAM/2 (the thickest one used by the meshes)
+    '''
+    coords = morphology[:, :3]
+    radii = morphology[:, 3].max(axis=1)/2*radius_factor
+    return np.stack([coords.min(axis=2) - radii[:,None], coords.max(axis=2) + radii[:,None]], axis=1)
+
+def box_corners(bounds):
+    '''(Nboxes, 8, 3) corners of (Nboxes, 2, 3) bounding boxes'''
+    select = np.array([[i>>2 & 1, i>>1 & 1, i & 1] for i in range(8)]) # Min (0) or max (1) per axis
+    return bounds[np.arange(len(bounds))[:,None,None], select[None], np.arange(3)[None,None]]
+
+def visible_boxes(corners, half_width, half_height, clip_start, clip_end, ortho=False,
+                  pixels_per_unit=1.0, min_pixels=0.0, margin=0.1):
+    '''
+        (Nboxes,) bool array of the boxes (corners in camera space) that may be seen by the camera.
+            half_width, half_height - half size of the view at distance 1 (perspective) or in scene units (ortho)
+            pixels_per_unit - pixels per scene unit at distance 1 (perspective) or at any distance (ortho)
+            min_pixels - boxes whose diagonal covers fewer pixels are culled
+            margin - relative widening of the frustum (e.g. for motion blur)
+    '''
+    x, y = corners[..., 0], corners[..., 1]
+    depth = -corners[..., 2]
+    scale = np.ones_like(depth) if ortho else depth
+    half_width = half_width*(1+margin)
+    half_height = half_height*(1+margin)
+
+    culled = (np.all(depth < clip_start, axis=1) | np.all(depth > clip_end, axis=1)
+              | np.all(x > half_width*scale, axis=1) | np.all(x < -half_width*scale, axis=1)
+              | np.all(y > half_height*scale, axis=1) | np.all(y < -half_height*scale, axis=1))
+
+    if min_pixels > 0:
+        diagonal = np.linalg.norm(corners[:, 7] - corners[:, 0], axis=1)
+        if ortho:
+            pixels = diagonal*pixels_per_unit
+        else:
+            nearest = np.maximum(depth.min(axis=1), clip_start) # Closest corner, the largest possible projection
+            pixels = diagonal*pixels_per_unit/nearest
+        culled |= pixels < min_pixels
+    return ~culled
@@ -0,0 +1,229 @@
+import bpy
+import numpy as np
+from .utils import load_sections_dicts
+from .columnar_format import is_columnar, ColumnarRecording
+from .dataset_cache import DATASET_CACHE
+from .quantisation import int16_parameters, encode, error_bound
+
+REDUCE_BLOCK = 1024 # Frames per block in reductions, bounds the memory used on memory mapped recordings
+
+## ------------------------------ Neuron dataset ---------------------------------------------
+
+class NeuronDataset():
+    '''
+        Dense representation of a NEURON recording, shared by the neuron builder, the frame handler,
+        the graph builder and the material auto-ranging.
+
+        The ragged per-section data is concatenated once and indexed with offsets:
+            types (Nsections,) - section types
+            point_offsets (Nsections+1,) - start of each section in X, Y, Z, DIAM (Npoints,)
+            segment_offsets (Nsections+1,) - start of each section in a voltage row
+            voltage (Nframes, Nsegments) - one contiguous row per frame, float32 or compact (see quantisation):
+                float16, or int16 with per-section voltage_scale and voltage_offset (Nsections,)
+    '''
+    def __init__(self, types, point_offsets, X, Y, Z, DIAM, segment_offsets, voltage, section_means=None,
+                 voltage_scale=None, voltage_offset=None):
+        self.types = list(types)
+        self.point_offsets = np.asarray(point_offsets)
+        self.X = X
+        self.Y = Y
+        self.Z = Z
+        self.DIAM = DIAM
+        self.segment_offsets = np.asarray(segment_offsets)
+        self.voltage = voltage
+        self.voltage_scale = voltage_scale
+        self.voltage_offset = voltage_offset
+        if voltage_scale is not None: # Per segment column, to decode whole rows at once
+            counts = np.diff(self.segment_offsets)
+            self._column_scale = np.repeat(np.asarray(voltage_scale, dtype=np.float32), counts)
+            self._column_offset = np.repeat(np.asarray(voltage_offset, dtype=np.float32), counts)
+
+        self._section_means = section_means   # (Nsections, Nframes), computed on first use
+        self._section_minima = None
+        self._section_maxima = None
+        self._section_runs = {} # tolerance -> (Nsections, Nframes) change counters
+
+    @classmethod
+    def from_sections_dicts(cls, sections_dicts, storage="FLOAT32"):
+        '''
+            Convert the list of section dicts (as exported from NEURON) into dense arrays.
+            storage - "FLOAT32", "FLOAT16" or "INT16", sections are encoded one at a time
+        '''
+        n_points = [len(sec["X"]) for sec in sections_dicts]
+        n_segments = [len(sec["Voltage"][0]) for sec in sections_dicts]
+        point_offsets = np.concatenate([[0], np.cumsum(n_points)]).astype(np.int64)
+        segment_offsets = np.concatenate([[0], np.cumsum(n_segments)]).astype(np.int64)
+        morphology = [np.concatenate([np.asarray(sec[coord], dtype=float).reshape(-1) for sec in sections_dicts])
+                      for coord in ["X", "Y", "Z", "DIAM"]]
+
+        n_frames = len(sections_dicts[0]["Voltage"])
+        voltage = np.empty((n_frames, segment_offsets[-1]), dtype=encode(0, storage, 1, 0).dtype)
+        section_means = np.empty((len(sections_dicts), n_frames), dtype=np.float32) # From the exact values
+        scale = np.ones(len(sections_dicts), dtype=np.float32)
+        offset = np.zeros(len(sections_dicts), dtype=np.float32)
+        for k,sec in enumerate(sections_dicts):
+            values = np.asarray(sec["Voltage"], dtype=np.float32)
+            if storage == "INT16":
+                scale[k], offset[k] = int16_parameters(values.min(), values.max())
+            voltage[:, segment_offsets[k]:segment_offsets[k+1]] = encode(values, storage, scale[k], offset[k])
+            section_means[k] = values.mean(axis=1)
+
+        if storage != "INT16":
+            scale, offset = None, None
+        return cls([sec["type"] for sec in sections_dicts], point_offsets, *morphology, segment_offsets, voltage,
+                   section_means=section_means, voltage_scale=scale, voltage_offset=offset)
+
+    @classmethod
+    def from_columnar(cls, recording):
+        ''' Wrap a (memory mapped) ColumnarRecording without reading the voltages '''
+        return cls(recording.types, recording.point_offsets,
+                   recording.X, recording.Y, recording.Z, recording.DIAM,
+                   recording.segment_offsets, recording.voltage,
+                   section_means=recording.section_means,
+                   voltage_scale=getattr(recording, "voltage_scale", None),
+                   voltage_offset=getattr(recording, "voltage_offset", None))
+
+    @property
+    def n_sections(self):
+        return len(self.types)
+
+    @property
+    def n_frames(self):
+        return self.voltage.shape[0]
+
+    @property
+    def nbytes(self):
+        ''' Memory held in RAM (memory mapped arrays live on disk) '''
+        arrays = [self.X, self.Y, self.Z, self.DIAM, self.voltage,
+                  self._section_means, self._section_minima, self._section_maxima, *self._section_runs.values()]
+        return sum(a.nbytes for a in arrays if a is not None and not isinstance(a, np.memmap))
+
+    def section_points(self, k):
+        ''' NEURON coordinates and diameters (X, Y, Z, DIAM) of one section '''
+        points = slice(self.point_offsets[k], self.point_offsets[k+1])
+        return self.X[points], self.Y[points], self.Z[points], self.DIAM[points]
+
+    @property
+    def storage(self):
+        if self.voltage_scale is not None:
+            return "INT16"
+        return "FLOAT16" if self.voltage.dtype == np.float16 else "FLOAT32"
+
+    @property
+    def quantisation_error(self):
+        ''' Upper bound of the absolute error of the decoded voltages (0 for float32 storage) '''
+        max_abs = max(abs(v) for v in self.voltage_range) if self.storage == "FLOAT16" else 0.0
+        return error_bound(self.storage, self.voltage_scale, max_abs)
+
+    def section_voltage(self, k):
+        ''' (Nframes, Nseg) float32 voltages of one section '''
+        columns = slice(self.segment_offsets[k], self.segment_offsets[k+1])
+        values = self.voltage[:, columns]
+        if self.voltage_scale is not None:
+            return values*self.voltage_scale[k] + self.voltage_offset[k]
+        return np.asarray(values, dtype=np.float32)
+
+    def voltage_rows(self, start, stop, out=None):
+        '''
+            Segment voltages of frames [start, stop), as a (frames, Nsegments) float32 array.
+            Compact storage is decoded here, only for the frames read (into out, if given).
+        '''
+        rows = self.voltage[start:stop]
+        if self.voltage_scale is not None:
+            out = np.multiply(rows, self._column_scale, out=out, dtype=np.float32)
+            return np.add(out, self._column_offset, out=out)
+        if out is not None:
+            out[...] = rows
+            return out
+        return np.asarray(rows, dtype=np.float32)
+
+    def section_mean_diameters(self):
+        counts = np.diff(self.point_offsets)
+        return np.add.reduceat(np.asarray(self.DIAM, dtype=float), self.point_offsets[:-1]) / counts
+
+    def _reduce_sections(self):
+        ''' Means, minima and maxima of every section in every frame, in one vectorised pass over the voltages '''
+        starts = self.segment_offsets[:-1]
+        counts = np.diff(self.segment_offsets)
+        means = np.empty((self.n_sections, self.n_frames), dtype=np.float32)
+        minima = np.empty_like(means)
+        maxima = np.empty_like(means)
+        for start in range(0, self.n_frames, REDUCE_BLOCK):
+            block = self.voltage_rows(start, start+REDUCE_BLOCK)
+            frames = slice(start, start+len(block))
+            means[:, frames] = (np.add.reduceat(block, starts, axis=1, dtype=float) / counts).T
+            minima[:, frames] = np.minimum.reduceat(block, starts, axis=1).T
+            maxima[:, frames] = np.maximum.reduceat(block, starts, axis=1).T
+        if self._section_means is None:
+            self._section_means = means
+        self._section_minima = minima
+        self._section_maxima = maxima
+
+    @property
+    def section_means(self):
+        ''' (Nsections, Nframes) mean voltage of every section '''
+        if self._section_means is None:
+            self._reduce_sections()
+        return self._section_means
+
+    @property
+    def section_minima(self):
+        if self._section_minima is None:
+            self._reduce_sections()
+        return self._section_minima
+
+    @property
+    def section_maxima(self):
+        if self._section_maxima is None:
+            self._reduce_sections()
+        return self._section_maxima
+
+    def section_runs(self, tolerance):
+        '''
+            (Nsections, Nframes) int32 change counters: the counter of a section is incremented on every frame where
+            one of its segments moves to another tolerance-wide voltage bin (any change with tolerance 0).
+            A section does not need to be written again while its counter equals the one of the frame shown,
+            as its voltages moved by less than the tolerance since.
+        '''
+        if tolerance in self._section_runs:
+            return self._section_runs[tolerance]
+        starts = self.segment_offsets[:-1]
+        runs = np.empty((self.n_sections, self.n_frames), dtype=np.int32)
+        counters = np.zeros(self.n_sections, dtype=np.int32)
+        previous = None
+        for start in range(0, self.n_frames, REDUCE_BLOCK):
+            block = self.voltage_rows(start, start+REDUCE_BLOCK)
+            bins = np.floor(block/tolerance) if tolerance > 0 else block
+            if previous is None:
+                previous = bins[:1]
+            changed = bins != np.concatenate([previous, bins[:-1]])
+            changed_sections = np.logical_or.reduceat(changed, starts, axis=1) # (frames, Nsections)
+            block_runs = counters + np.cumsum(changed_sections, axis=0, dtype=np.int32)
+            runs[:, start:start+len(block)] = block_runs.T
+            counters = block_runs[-1]
+            previous = bins[-1:]
+        self._section_runs[tolerance] = runs
+        return runs
+
+    @property
+    def voltage_range(self):
+        ''' (min, max) voltage over all segments and frames '''
+        return float(np.min(self.section_minima)), float(np.max(self.section_maxima))
+
+def load_dataset(path, storage="FLOAT32"):
+    '''
+        Load a .pickle (converted to dense arrays, with the given voltage storage)
+        or a columnar .bspk recording (memory mapped, with the storage chosen when it was converted)
+    '''
+    if is_columnar(path):
+        return NeuronDataset.from_columnar(ColumnarRecording(path))
+    return NeuronDataset.from_sections_dicts(load_sections_dicts(path), storage)
+
+def get_dataset(path, storage="FLOAT32"):
+    '''
+        The NeuronDataset of a recording, shared through the session dataset cache.
+        It is shared by every neuron and graph of the same file, so it should not be modified.
+    '''
+    path = bpy.path.abspath(path)
+    params = () if is_columnar(path) else (storage,)
+    return DATASET_CACHE.get(path, lambda: load_dataset(path, storage), params)
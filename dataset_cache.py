@@ -0,0 +1,86 @@
+import os
+import sys
+import numpy as np
+from collections import OrderedDict
+
+## ------------------------------ In-session dataset cache -----------------------------------
+
+def estimate_nbytes(obj, _sample=8):
+    '''
+        Rough memory footprint of decoded data. Long lists are estimated from their first elements,
+        memory mapped arrays count as free (they live on disk).
+    '''
+    if isinstance(obj, np.memmap):
+        return 0
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, (list, tuple)):
+        if len(obj) == 0:
+            return sys.getsizeof(obj)
+        sample = obj[:_sample]
+        return sys.getsizeof(obj) + len(obj) * sum(estimate_nbytes(o) for o in sample) // len(sample)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(estimate_nbytes(v) for v in obj.values())
+    if hasattr(obj, "nbytes"): # e.g. NeuronDataset
+        return obj.nbytes
+    return sys.getsizeof(obj)
+
+class DatasetCache():
+    '''
+        LRU cache of decoded datasets shared by the whole session, bounded by (estimated) bytes.
+
+        Entries are keyed on the absolute path, mtime and size of the source file plus optional build parameters,
+        so a file that changed on disk is decoded again, and derived data (e.g. resampled morphology)
+        is cached per set of parameters.
+    '''
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self.entries = OrderedDict() # key -> (value, nbytes), most recently used last
+
+    @staticmethod
+    def make_key(path, params=()):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        return (path, stat.st_mtime_ns, stat.st_size, tuple(params))
+
+    @property
+    def nbytes(self):
+        return sum(nbytes for _,nbytes in self.entries.values())
+
+    def get(self, path, loader, params=()):
+        '''
+            Cached value for (path, params). On a miss, loader() is called and its result stored.
+        '''
+        key = self.make_key(path, params)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
+
+        # Entries of an older version of the file can not be hit anymore
+        self.evict(path, keep_version=key[1:3])
+
+        value = loader()
+        self.entries[key] = (value, estimate_nbytes(value))
+        self.shrink()
+        return value
+
+    def shrink(self):
+        ''' Evict least recently used entries until the budget is met (the newest entry is always kept) '''
+        while len(self.entries) > 1 and self.nbytes > self.budget_bytes:
+            self.entries.popitem(last=False)
+
+    def set_budget(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self.shrink()
+
+    def evict(self, path=None, keep_version=None):
+        ''' Drop all entries (of one file, optionally except one version of it) '''
+        if path is None:
+            self.entries.clear()
+            return
+        path = os.path.abspath(path)
+        for key in list(self.entries):
+            if key[0] == path and key[1:3] != keep_version:
+                del self.entries[key]
+
+DATASET_CACHE = DatasetCache(budget_bytes=2*2**30)
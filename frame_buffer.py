@@ -0,0 +1,62 @@
+import numpy as np
+from collections import OrderedDict
+
+## ------------------------------ Per-vertex frame buffer ------------------------------------
+
+class FrameBuffer():
+    '''
+        Container for precomputed per-vertex voltages, one float32 row per frame (frames x vertices).
+
+        If the whole array fits in the memory budget it is materialised once, as one contiguous block.
+        Otherwise the frames are computed on demand in chunks of consecutive frames,
+        keeping only as many of the most recently used chunks as fit in the budget (LRU).
+    '''
+    def __init__(self, compute_frames, n_frames, n_verts, budget_bytes, chunk_frames=16):
+        '''
+            compute_frames(start, stop) - function returning the (stop-start, n_verts) float32 rows of frames [start, stop)
+            n_frames - number of frames in the recording
+            n_verts - number of vertices (row length)
+            budget_bytes - maximum memory held by the buffer
+            chunk_frames - number of frames computed at once when the full buffer does not fit
+        '''
+        self.compute_frames = compute_frames
+        self.n_frames = n_frames
+        self.n_verts = n_verts
+        self.budget_bytes = budget_bytes
+
+        row_bytes = max(n_verts, 1) * np.dtype(np.float32).itemsize
+        self.full = n_frames * row_bytes <= budget_bytes
+        if self.full:
+            self.data = compute_frames(0, n_frames)
+            self.chunk_frames = n_frames
+            self.max_chunks = 1
+        else:
+            self.data = None
+            self.chunk_frames = int(max(1, min(chunk_frames, budget_bytes // row_bytes)))
+            self.max_chunks = int(max(1, budget_bytes // (self.chunk_frames*row_bytes)))
+        self.chunks = OrderedDict() # chunk index -> (chunk_frames, n_verts) array, most recently used last
+
+    @property
+    def nbytes(self):
+        if self.full:
+            return self.data.nbytes
+        return sum(chunk.nbytes for chunk in self.chunks.values())
+
+    def get(self, frame):
+        ''' Row of per-vertex values of a frame (None if the frame is outside the recording) '''
+        if frame < 0 or frame >= self.n_frames:
+            return None
+        if self.full:
+            return self.data[frame]
+
+        chunk_id, row = divmod(frame, self.chunk_frames)
+        chunk = self.chunks.get(chunk_id)
+        if chunk is None:
+            start = chunk_id*self.chunk_frames
+            chunk = self.compute_frames(start, min(start+self.chunk_frames, self.n_frames))
+            self.chunks[chunk_id] = chunk
+            while len(self.chunks) > self.max_chunks:
+                self.chunks.popitem(last=False) # Evict least recently used
+        else:
+            self.chunks.move_to_end(chunk_id)
+        return chunk[row]
@@ -0,0 +1,124 @@
+import bpy
+from bpy.app.handlers import persistent
+from .dataset_cache import DATASET_CACHE
+from .voltage_store import release_voltage_array
+from .graph_builder import clear_section_tips
+
+## ------------------------------ Central frame dispatcher -----------------------------------
+
+class FrameDispatcher():
+    '''
+        Single frame_change_post handler shared by all animated neurons.
+
+        Neurons are kept in a registry instead of appending one handler each. On every frame change the
+        segment voltages are computed once per recording and segmentation (neurons built from the same file
+        share them), then every enabled neuron gathers its vertex row and writes its attributes.
+        A neuron is skipped while the "animate" custom property of its parent EMPTY is False.
+
+        The registry is keyed by the pointer of the parent EMPTY, so reloading a neuron replaces its entry.
+        Neurons whose parent was deleted are dropped (with their cached data) on the next update.
+    '''
+    def __init__(self):
+        self.neurons = {} # parent EMPTY pointer -> BlenderNeuron
+        self.rendering = False # Set between render_init and render_complete/render_cancel
+        self.skipped_sections = 0 # Sections left untouched in the last update, over all neurons
+        self.total_sections = 0
+
+    @staticmethod
+    def key(ob):
+        return ob.as_pointer()
+
+    def add(self, neuron):
+        '''Register a neuron, replacing a previous registration of the same parent EMPTY'''
+        self.neurons[self.key(neuron.parent_ob)] = neuron
+        self.register()
+
+    def remove(self, ob):
+        '''Unregister the neuron of a parent EMPTY and free its cached data. Returns whether it was registered'''
+        neuron = self.neurons.pop(self.key(ob), None)
+        if neuron is None:
+            return False
+        self.release(neuron, self.key(ob))
+        return True
+
+    def release(self, neuron, key):
+        '''Free the data only this neuron was using'''
+        release_voltage_array(key)
+        clear_section_tips()
+        if not any(other.filepath == neuron.filepath for other in self.neurons.values()):
+            DATASET_CACHE.evict(bpy.path.abspath(neuron.filepath))
+        if not self.neurons:
+            self.unregister()
+
+    def prune(self, *args):
+        '''Drop the neurons whose parent EMPTY was deleted'''
+        for key,neuron in list(self.neurons.items()):
+            try:
+                alive = neuron.parent_ob.users > 0
+            except ReferenceError: # The Blender object was freed
+                alive = False
+            if not alive:
+                del self.neurons[key]
+                self.release(neuron, key)
+
+    def clear(self):
+        for key in self.neurons:
+            release_voltage_array(key)
+        self.neurons.clear()
+        self.unregister()
+
+    def is_registered(self, ob):
+        return self.key(ob) in self.neurons
+
+    @staticmethod
+    def is_enabled(neuron):
+        return bool(neuron.parent_ob.get("animate", True))
+
+    def dispatch(self, scene, *args):
+        self.prune()
+        frame = scene.frame_current
+        segment_rows = {} # Segment voltages of the frame, computed once per recording and segmentation
+        self.skipped_sections, self.total_sections = 0, 0
+        for neuron in list(self.neurons.values()):
+            try:
+                if not self.is_enabled(neuron):
+                    continue
+                neuron.update_frame(frame, segment_rows, rendering=self.rendering, scene=scene)
+                self.skipped_sections += neuron.skipped_sections
+                self.total_sections += neuron.dataset.n_sections
+            except Exception as e: # e.g. deleted objects, one broken neuron should not stop the others
+                print("BlenderSpiky: could not update {}: {}".format(getattr(neuron, "name", neuron), e))
+
+    def render_init(self, scene, *args):
+        self.rendering = True
+        self.dispatch(scene) # The render level of detail may be behind the current frame
+
+    def render_end(self, scene, *args):
+        self.rendering = False
+        self.dispatch(scene) # The viewport level of detail was not written while rendering
+
+    def handlers(self):
+        handlers = bpy.app.handlers
+        return [(handlers.frame_change_post, self.dispatch),
+                (handlers.render_init, self.render_init),
+                (handlers.render_complete, self.render_end),
+                (handlers.render_cancel, self.render_end),
+                (handlers.depsgraph_update_post, self.prune)] # Deleting a parent frees its neuron right away
+
+    def register(self):
+        for handler_list,handler in self.handlers():
+            if handler not in handler_list:
+                handler_list.append(handler)
+        bpy.context.scene.render.use_lock_interface = True # This is to ensure render doesn't crash
+
+    def unregister(self):
+        for handler_list,handler in self.handlers():
+            while handler in handler_list:
+                handler_list.remove(handler)
+
+FRAME_DISPATCHER = FrameDispatcher()
+
+@persistent
+def clear_on_load(*args):
+    '''Objects of the previous file are freed on load, so are their neurons (use "Reload animation data")'''
+    FRAME_DISPATCHER.clear()
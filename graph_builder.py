@@ -1,12 +1,364 @@
 import bpy
+from bpy.app.handlers import persistent
+import time
 import numpy as np
-from mathutils import Matrix #for shifting origin of graphs
 
 from .utils import ShowMessageBox as out
 from .utils import set_material_to_object, set_material_color
-from .utils import remove_curve
+from .utils import remove_curve, write_mesh_data
+from .dataset import get_dataset
+from .voltage_store import get_section_voltage, load_voltage_array
+from .trace_pyramid import TracePyramid
+from .spikes import detect_spikes, raster_geometry
+from .graph_texture import new_canvas, draw_trace, draw_hline, draw_vline
 
 SCALE = (.01, 1)
+GRAPH_MATERIAL = 'mat_graphs' # Shared by all graphs (they all have graph_color)
+
+## ------------------------------ Section lookup --------------------------------------------
+
+def section_key(ob, section_ID=None):
+    '''
+        Name under which the graph of a section is registered.
+        A section object is referred to by its name, a section inside a merged neuron mesh as "mesh[ID]"
+    '''
+    if section_ID is None:
+        return ob.name
+    return f'{ob.name}[{section_ID}]'
+
+def resolve_section(key):
+    ''' Inverse of section_key: returns (section object, section ID) '''
+    if key.endswith(']') and '[' in key:
+        ob_name, section_ID = key[:-1].rsplit('[', 1)
+        return bpy.data.objects[ob_name], int(section_ID)
+    ob = bpy.data.objects[key]
+    return ob, ob['ID']
+
+def get_vertex_section_IDs(ob, selected_only=False):
+    ''' Section ID of every (selected) vertex of a merged neuron mesh '''
+    if ob.mode == 'EDIT':
+        ob.update_from_editmode()
+    mesh = ob.data
+    IDs = np.empty(len(mesh.vertices), dtype=np.int32)
+    mesh.attributes['ID'].data.foreach_get("value", IDs)
+    if not selected_only:
+        return IDs
+    selected = np.zeros(len(mesh.vertices), dtype=bool)
+    mesh.vertices.foreach_get("select", selected)
+    return IDs[selected]
+
+def get_selected_section_ID(ob):
+    ''' Section ID of the first selected vertex of a merged neuron mesh (None if nothing is selected) '''
+    IDs = get_vertex_section_IDs(ob, selected_only=True)
+    if len(IDs) == 0:
+        return None
+    return int(IDs[0])
+
+def parse_ID_filter(text):
+    ''' Set of section IDs from a filter like "0, 4, 10-20" (None for an empty filter). Raises ValueError if malformed '''
+    if not text.strip():
+        return None
+    IDs = set()
+    for part in text.replace(' ', '').split(','):
+        try:
+            if '-' in part:
+                first, last = part.split('-', 1)
+                IDs.update(range(int(first), int(last)+1))
+            elif part:
+                IDs.add(int(part))
+        except ValueError:
+            raise ValueError('Invalid section IDs "{}", use e.g. 0, 4, 10-20'.format(part)) from None
+    return IDs
+
+def collect_section_keys(objects, section_type='', ID_filter=''):
+    '''
+        section_keys of the sections of the given objects, matching a section type and an ID filter (empty: any).
+        A section object gives its section, a merged neuron mesh its sections with a selected vertex (all of them
+        if none is selected), and a neuron EMPTY the sections of all its children.
+    '''
+    IDs_allowed = parse_ID_filter(ID_filter)
+    keys = []
+    for ob in objects:
+        children = ob.children if "filepath" in ob else [ob]
+        for child in children:
+            if child.get("lod") == "RENDER" or child.parent is None or "filepath" not in child.parent:
+                continue # Only sections of neurons (the viewport level, if there are two)
+            types = get_dataset(child.parent['filepath'], child.parent.get('voltage_storage', 'FLOAT32')).types
+            if child.get('merged'):
+                IDs = np.unique(get_vertex_section_IDs(child, selected_only=child is ob))
+                if len(IDs) == 0:
+                    IDs = np.unique(get_vertex_section_IDs(child))
+                candidates = [(section_key(child, int(ID)), int(ID)) for ID in IDs]
+            elif "ID" in child:
+                candidates = [(section_key(child), child["ID"])]
+            else:
+                continue
+            keys += [key for key,ID in candidates
+                     if (not section_type or types[ID] == section_type) and (IDs_allowed is None or ID in IDs_allowed)]
+    return list(dict.fromkeys(keys)) # Without duplicates, in order
+
+_section_tips = {} # (mesh pointer, number of vertices, neuron location) -> {section ID: (vertex index, co)}
+
+def get_section_tips(section):
+    '''
+        Vertex farthest from the neuron origin of every section of a section object (or merged neuron mesh).
+        Vertex positions are read in one call. The result is cached until the mesh changes its vertex count
+        or the neuron moves; neurons being rebuilt or removed, and loading a file, clear the cache.
+    '''
+    mesh = section.data
+    key = (mesh.as_pointer(), len(mesh.vertices), tuple(section.parent.location))
+    if key not in _section_tips:
+        co = np.empty(len(mesh.vertices)*3, dtype=np.float32)
+        mesh.vertices.foreach_get("co", co)
+        co = co.reshape(-1, 3)
+        distances = np.linalg.norm(co - np.array(section.parent.location, dtype=np.float32), axis=1)
+        
+        if section.get('merged'):
+            IDs = get_vertex_section_IDs(section)
+            order = np.lexsort((-distances, IDs)) # Per section, the farthest vertex first
+            first = order[np.r_[True, IDs[order][1:] != IDs[order][:-1]]]
+            tips = {int(ID): (int(v), tuple(co[v])) for ID,v in zip(IDs[first], first)}
+        else:
+            v = int(np.argmax(distances))
+            tips = {section['ID']: (v, tuple(co[v]))}
+        
+        for old in [k for k in _section_tips if k[0] == key[0]]: # Older vertex count or location of the same mesh
+            del _section_tips[old]
+        _section_tips[key] = tips
+    return _section_tips[key]
+
+def clear_section_tips():
+    ''' Forget all section tips, e.g. when neuron meshes are rebuilt or removed (their pointers may be reused) '''
+    _section_tips.clear()
+
+## ------------------------------ Trace pyramids --------------------------------------------
+
+_pyramids = {} # (graph object pointer, number of samples) -> TracePyramid
+
+def get_pyramid(ob):
+    ''' Min/max pyramid of the trace of a graph object, built once per graph (the trace is only read on a miss) '''
+    plot_data = ob['plot_data']
+    key = (ob.as_pointer(), len(plot_data))
+    if key not in _pyramids:
+        _pyramids[key] = TracePyramid(np.asarray(plot_data, dtype=np.float32))
+    return _pyramids[key]
+
+def forget_pyramid(ob):
+    ''' Drop the pyramid of a graph object, before it is removed (its pointer may be reused) '''
+    pointer = ob.as_pointer()
+    for key in [k for k in _pyramids if k[0] == pointer]:
+        del _pyramids[key]
+
+@persistent
+def clear_graph_caches(*args):
+    ''' Graph and neuron objects of the previous file are freed on load, their pointers may be reused '''
+    _pyramids.clear()
+    clear_section_tips()
+    GRAPH_UPDATES.cancel() # Pending updates were meant for the previous file
+
+def graph_level(pyramid, animated=False):
+    '''
+        Pyramid level to draw a graph at, from the plot width (time scale) and the point budget.
+        Animated graphs keep every sample: their reveal advances one point per frame.
+    '''
+    if animated:
+        return 0
+    props = bpy.context.scene.blenderspiky_graphbuild
+    width = len(pyramid.trace) * SCALE[0] * props.t_scalar
+    return pyramid.choose_level(width, props.graph_resolution, props.max_graph_points)
+
+def graph_coordinates(pyramid, level):
+    ''' (xs, ys) of the points of a pyramid level at the current scales '''
+    props = bpy.context.scene.blenderspiky_graphbuild
+    material_props = bpy.context.scene.blenderspiky_materials
+    indices, values = pyramid.points(level)
+    
+    ymin, ymax = material_props.min_value, material_props.max_value
+    xs = indices * SCALE[0] * props.t_scalar
+    ys = np.clip(values,ymin,ymax)
+    ys = (ys-np.clip(pyramid.minimum,ymin,ymax)) * SCALE[1] * props.v_scalar
+    return xs, ys
+
+def write_spline_points(curve, data, z=0):
+    ''' Write the points of the (single POLY) spline of a curve in one call, replacing it if the count differs '''
+    xs, ys = data
+    co = np.empty((len(xs), 4), dtype=np.float32)
+    co[:,0] = xs
+    co[:,1] = ys
+    co[:,2] = z
+    co[:,3] = 1.0 # nurbs weight
+    
+    if len(curve.splines) and len(curve.splines[0].points) == len(co):
+        spline = curve.splines[0]
+    else:
+        curve.splines.clear()
+        spline = curve.splines.new(type='POLY')
+        spline.points.add(len(co)-1) # theres already one point by default
+    spline.points.foreach_set("co", co.ravel())
+    return spline
+
+def write_straight_line(spline, start, end):
+    ''' Write a straight two point BEZIER spline in one call per attribute, handles on the line '''
+    co = np.array([start, end], dtype=np.float32)
+    step = (co[1]-co[0])/3
+    spline.bezier_points.foreach_set("co", co.ravel())
+    spline.bezier_points.foreach_set("handle_left", (co-step).ravel())
+    spline.bezier_points.foreach_set("handle_right", (co+step).ravel())
+
+def plot_minimum(plot):
+    ''' Minimum of the trace of a graph object, cached on it (scanning the IDProperty array is slow) '''
+    if 'plot_min' not in plot:
+        plot['plot_min'] = float(np.min(plot['plot_data']))
+    return plot['plot_min']
+
+## ------------------------------ Batch graph building --------------------------------------
+
+def build_section_graphs(keys):
+    '''
+        Graphs of many sections at once. The traces of all sections of a neuron are read in one indexing
+        of its voltage array, graphs share one material and are stacked below each other.
+        Returns the SectionGraphs.
+    '''
+    props = bpy.context.scene.blenderspiky_graphbuild
+    material_props = bpy.context.scene.blenderspiky_materials
+    spacing = 1.25 * abs(material_props.max_value - material_props.min_value) * SCALE[1] * props.v_scalar
+
+    by_parent = {}
+    for key in keys:
+        section, section_ID = resolve_section(key)
+        by_parent.setdefault(section.parent.name, []).append((key, section_ID))
+
+    traces = {}
+    for parent_name, items in by_parent.items():
+        IDs = [section_ID for _,section_ID in items]
+        parent_traces = load_voltage_array(bpy.data.objects[parent_name])[IDs] # (Nkeys, Nframes), one read
+        traces.update((key, trace) for (key,_),trace in zip(items, parent_traces))
+
+    bpy.ops.object.select_all(action='DESELECT')
+    graphs = []
+    for k,key in enumerate(keys):
+        graph = SectionGraph(key, plot_data=traces[key], location=(0, -k*spacing, 0), select=False)
+        graph.ob.select_set(True)
+        graphs.append(graph)
+    return graphs
+
+## ------------------------------ Spike raster ----------------------------------------------
+
+def build_raster(parent, spikes, rows):
+    '''
+        Raster plot of the spikes of a neuron: one mesh with a mark per spike and a row per section,
+        replacing a previous raster of the neuron. The "ID" point attribute holds the section of every mark.
+    '''
+    props = bpy.context.scene.blenderspiky_graphbuild
+    name = f'raster_{parent.name}'
+    old = bpy.data.objects.get(name)
+    if old is not None:
+        old_mesh = old.data
+        bpy.data.objects.remove(old)
+        if old_mesh.users == 0:
+            bpy.data.meshes.remove(old_mesh)
+    
+    co, loop_start, loop_total, loop_vertex, vertex_section = raster_geometry(
+        spikes, rows, SCALE[0]*props.t_scalar, props.raster_row_height, 2*props.line_width)
+    mesh = write_mesh_data(bpy.data.meshes.new(name), co, loop_start, loop_total, loop_vertex)
+    mesh.attributes.new(name="ID", type="INT", domain="POINT").data.foreach_set("value", vertex_section)
+    
+    ob = bpy.data.objects.new(name, mesh)
+    bpy.context.scene.collection.objects.link(ob)
+    ob['rows'] = list(rows)
+    ob['spike_threshold'] = props.spike_threshold
+    ob['spike_refractory'] = props.spike_refractory
+    
+    set_material_to_object(name, GRAPH_MATERIAL)
+    set_material_color(GRAPH_MATERIAL, props.graph_color)
+    return ob
+
+## ------------------------------ Texture graphs --------------------------------------------
+
+MAX_TEXTURE_SIZE = 4096 # Pixels, per side
+
+def texture_plane(name):
+    '''
+        Plane object of a texture graph, showing the image 'img_' + name through its material 'mat_' + name.
+        Its size and image are set by rasterize_graph.
+    '''
+    mesh = write_mesh_data(bpy.data.meshes.new('mesh_' + name), np.zeros(12, dtype=np.float32),
+                           np.array([0]), np.array([4]), np.arange(4))
+    uv_layer = mesh.uv_layers.new(name="UVMap")
+    uv_layer.data.foreach_set("uv", np.array([0,0, 1,0, 1,1, 0,1], dtype=np.float32))
+    ob = bpy.data.objects.new(name, mesh)
+    bpy.context.scene.collection.objects.link(ob)
+    
+    image = bpy.data.images.new('img_' + name, 1, 1, alpha=True)
+    mat = bpy.data.materials.new('mat_' + name)
+    mat.use_nodes = True
+    nodes, links = mat.node_tree.nodes, mat.node_tree.links
+    texture = nodes.new("ShaderNodeTexImage")
+    texture.image = image
+    links.new(texture.outputs["Color"], nodes["Principled BSDF"].inputs["Base Color"])
+    links.new(texture.outputs["Alpha"], nodes["Principled BSDF"].inputs["Alpha"])
+    if hasattr(mat, "surface_render_method"): # Blender 4.2+
+        mat.surface_render_method = 'BLENDED'
+    else:
+        mat.blend_method = 'BLEND'
+    mesh.materials.append(mat)
+    
+    ob['plot_mode'] = 'Texture'
+    return ob
+
+def rasterize_graph(ob):
+    '''
+        Draw the trace of a texture graph (with its reference line and scale bars, if shown) into its image
+        and fit its plane, at the current scales and styles. The plane has the extent the curves would have.
+    '''
+    props = bpy.context.scene.blenderspiky_graphbuild
+    resolution = props.texture_resolution
+    pyramid = get_pyramid(ob)
+    trace_width = len(pyramid.trace) * SCALE[0] * props.t_scalar
+    xs, ys = graph_coordinates(pyramid, pyramid.choose_level(trace_width, 2*resolution))
+    
+    ref_y = (props.ref_height-plot_minimum(ob)) * SCALE[1] * props.v_scalar
+    v_bar = props.v_bar_magnitude*SCALE[1]*props.v_scalar
+    t_bar = props.t_bar_magnitude*SCALE[0]*props.t_scalar
+    
+    # Extent of the plane, in scene units
+    x1, y1 = trace_width, float(ys.max()) if len(ys) else 0.0
+    y0 = 0.0
+    pad = 2*props.line_width
+    if props.ref_lines:
+        y0, y1 = min(y0, ref_y), max(y1, ref_y)
+        pad = max(pad, 2*props.ref_width)
+    if props.scale_bars:
+        x1, y1 = max(x1, t_bar), max(y1, v_bar)
+        pad = max(pad, 2*props.scale_width)
+    x0, y0, x1, y1 = -pad, y0-pad, x1+pad, y1+pad
+    resolution = min(resolution, MAX_TEXTURE_SIZE/(x1-x0), MAX_TEXTURE_SIZE/(y1-y0))
+    width = max(int(np.ceil((x1-x0)*resolution)), 1)
+    height = max(int(np.ceil((y1-y0)*resolution)), 1)
+    
+    def px(x): return (np.asarray(x)-x0)*resolution
+    def py(y): return (np.asarray(y)-y0)*resolution
+    
+    canvas = new_canvas(width, height)
+    if props.scale_bars:
+        bar_width = 2*props.scale_width*resolution
+        draw_vline(canvas, px(0), py(0)-bar_width/2, py(v_bar), props.scale_color, bar_width)
+        draw_hline(canvas, py(0), px(0)-bar_width/2, px(t_bar), props.scale_color, bar_width)
+    if props.ref_lines:
+        draw_hline(canvas, py(ref_y), px(0), px(trace_width), props.ref_color, 2*props.ref_width*resolution)
+    draw_trace(canvas, px(xs), py(ys), props.graph_color, 2*props.line_width*resolution)
+    
+    image = bpy.data.images.get('img_' + ob.name)
+    if image is None:
+        image = bpy.data.images.new('img_' + ob.name, width, height, alpha=True)
+        ob.data.materials[0].node_tree.nodes["Image Texture"].image = image
+    if tuple(image.size) != (width, height):
+        image.scale(width, height)
+    image.pixels.foreach_set(canvas.ravel())
+    image.pack() # Generated images are not saved with the file otherwise
+    
+    ob.data.vertices.foreach_set("co", np.array([x0,y0,0, x1,y0,0, x1,y1,0, x0,y1,0], dtype=np.float32))
+    ob.data.update()
 
 ## ------------------------------ Section Graph container -----------------------------------
 
@@ -15,26 +367,39 @@ class SectionGraph():
         Container class for storing a graph object from the data in in BlenderSection
     '''
     
-    def __init__(self):
+    def __init__(self, key=None, plot_data=None, location=None, select=True):
+        '''
+            key - section_key of the section to plot (defaults to the selected section)
+            plot_data - voltage trace of the section, if already loaded (see build_section_graphs)
+            location - location of the graph object
+            select - whether to make the new graph the only selected object
+        '''
         self.mat = None
         
-        self.parent_section = bpy.context.selected_objects[0]
-        self.name = f'graph_{self.parent_section.name}'
+        if key is None:
+            key = section_key(bpy.context.selected_objects[0])
+        self.key = key
+        self.parent_section, self.section_ID = resolve_section(key)
+        self.name = f'graph_{self.key}'
         
         self.ob = None
         self.plot_type = None
         
         self.data_from = 'voltage_array'
-        self.plot_data = self._load_voltage_data()
+        self.plot_data = self._load_voltage_data() if plot_data is None else plot_data
         
-        self.build_graph() #sets self.ob
+        self.build_graph(select) #sets self.ob
+        if location is not None:
+            self.ob.location = location
         self.set_private_data()
+        if self.ob.get('plot_mode') == 'Texture':
+            rasterize_graph(self.ob)
             
         props = bpy.context.scene.blenderspiky_graphbuild
         if props.ref_lines:
-            ReferenceLine().build_ref_line(self.parent_section.name)
+            ReferenceLine().build_ref_line(self.key)
         if props.sg_curves:
-            SgCurve().build_sg_curve(self.parent_section.name)
+            SgCurve().build_sg_curve(self.key)
         
         
     def set_private_data(self):
@@ -42,49 +407,29 @@ class SectionGraph():
         attrs_to_save = ["plot_data"]
         for attr in attrs_to_save:
             self.ob[attr] = getattr(self, attr)
+        self.ob['plot_min'] = float(np.min(self.plot_data))
     
     def _load_voltage_data(self):
         
         if self.data_from == 'sections dict':
-            section_type,section_id = self.parent_section.name.split('_')
-            section_id = int(section_id)
-
-            filtered_data = [entry for entry in self.sections_dicts if 
-                            entry['type'] == section_type and 
-                            entry['ID'] == section_id]
-            
-            data = filtered_data[0]['Voltage']
-            voltage_data = np.array([np.mean(data[vals]) for vals in data])
+            # Shares the NeuronDataset with the neuron through the dataset cache
+            voltage_data = get_dataset(self.parent_section.parent['filepath'], self.parent_section.parent.get('voltage_storage', 'FLOAT32')).section_means[self.section_ID]
             
             
-        elif self.data_from == 'parent section by frame':
-            #extract data from parent_section for every frame and take mean
-            voltage_data = []
-            current_frame = bpy.context.scene.frame_current
-            bpy.context.scene.render.use_lock_interface = True # This is to ensure render doesn't crash
-            for f in range(bpy.context.scene.frame_end):
-                bpy.context.scene.frame_set(f)
-                
-                voltage = self.parent_section.data.attributes['Voltage']
-                n = len(voltage.data)
-                vals = [0.] * n
-                voltage.data.foreach_get("value", vals)
-                
-                voltage_data.append(np.mean(vals))
-            bpy.context.scene.frame_set(current_frame)
-            
         #### Probably the best method ####
         elif self.data_from == 'voltage_array':
-            voltage_data = self.parent_section.parent['voltage_array'][self.parent_section['ID']]
+            voltage_data = get_section_voltage(self.parent_section.parent, self.section_ID)
         
         return(voltage_data)
     
-    def build_graph(self):
-        # plot_mode = bpy.context.scene.blenderspiky_graphbuild.plot_mode
+    def build_graph(self, select=True):
+        plot_mode = bpy.context.scene.blenderspiky_graphbuild.plot_mode
         animate = bpy.context.scene.blenderspiky_graphbuild.animate
-            
-        # plot_mode == 'Native':
-        if not animate:
+        
+        if plot_mode == 'Texture': # Drawn by rasterize_graph, once the plot data is stored
+            self.ob = texture_plane(self.name)
+            _pyramids[(self.ob.as_pointer(), len(self.plot_data))] = TracePyramid(self.plot_data)
+        elif not animate:
             self.ob = self._native_line(
                 self.plot_data,
                 'static',
@@ -95,9 +440,9 @@ class SectionGraph():
                 'animate',
             )
             
-        # self.ob['plot_mode'] = plot_mode
-        bpy.ops.object.select_all(action='DESELECT')
-        self.ob.select_set(True)
+        if select:
+            bpy.ops.object.select_all(action='DESELECT')
+            self.ob.select_set(True)
    
     def _native_line(self, data, plot_type='static', name="object_name", z=0):
         '''
@@ -106,45 +451,36 @@ class SectionGraph():
         name = self.name
         props = bpy.context.scene.blenderspiky_graphbuild
         
-        xs = np.array( list(range(len(data))) ) * SCALE[0] * props.t_scalar
-        
-        ymin = bpy.context.scene.blenderspiky_materials.min_value
-        ymax = bpy.context.scene.blenderspiky_materials.max_value
-        ys = np.clip(data,ymin,ymax)
-        ys = (np.array(ys)-np.min(ys)) * SCALE[1] * props.v_scalar
-        
-        data = zip(xs,ys)
+        # Long traces are drawn from a min/max pyramid, at the level the time scale needs
+        pyramid = TracePyramid(data)
+        level = graph_level(pyramid, animated = plot_type == 'animate')
+        data = graph_coordinates(pyramid, level)
         
         if   plot_type == 'static':
             obj = self._plot_line_static(data, name, z)
             
         elif plot_type == 'animate':
             obj = self._plot_line_animate(data, name, z)
+        
+        _pyramids[(obj.as_pointer(), len(pyramid.trace))] = pyramid
+        obj['pyramid_level'] = level
+        obj['animated'] = plot_type == 'animate'
             
         obj.data.bevel_depth = props.line_width
         obj.data.use_fill_caps = True
         
-        graph_name = self.name
-        mat_name = 'mat_' + self.parent_section.name
-        
-        # set the material for the graph object and change the color
+        # set the (shared) material for the graph object and change the color
         color = props.graph_color
-        mat,_ = set_material_to_object(graph_name, mat_name)
-        set_material_color(mat_name, color)
+        mat,_ = set_material_to_object(self.name, GRAPH_MATERIAL)
+        set_material_color(GRAPH_MATERIAL, color)
         
         return(obj)
     
     def _curve_spline_line(self, data, z=0):
-        points = [[x,y,z] for (x,y) in data]
-        
-        # make a new curve with a new spline
+        # make a new curve with a new spline, points written in one call
         curve = bpy.data.curves.new('curve_' + self.name, 'CURVE')
         curve.dimensions = '3D'
-        spline = curve.splines.new(type='POLY')
-        spline.points.add(len(points)-1) # theres already one point by default
-        
-        for p, new_co in zip(spline.points, points):
-            p.co = (new_co + [1.0]) # add nurbs weight
+        spline = write_spline_points(curve, data, z)
         
         return(curve,spline)
     
@@ -166,17 +502,17 @@ class SectionGraph():
         obj = bpy.data.objects.new(name, curve)
         bpy.context.scene.collection.objects.link(obj)
 
-        for f,point in enumerate(spline.points):
-            point.radius = 0
-            point.keyframe_insert(data_path="radius", frame = f)
-            point.radius = 1
-            point.keyframe_insert(data_path="radius", frame = f+1)
-            
-        # obj.data.bevel_factor_end = 0
-        # obj.data.keyframe_insert(data_path="bevel_factor_end", frame = 1)
-        # obj.data.bevel_factor_end = 1
-        # number_of_points = len(obj.data.splines[0].points)
-        # obj.data.keyframe_insert(data_path="bevel_factor_end", frame = number_of_points)
+        # Reveal the line with one linear keyframe pair on the bevel end, instead of keyframes per point.
+        # Mapped to the points of the POLY spline, the line ends at point (sample) f on frame f.
+        last = max(len(spline.points)-1, 1)
+        curve.bevel_factor_mapping_end = 'RESOLUTION'
+        curve.bevel_factor_end = 0
+        curve.keyframe_insert(data_path="bevel_factor_end", frame = 0)
+        curve.bevel_factor_end = 1
+        curve.keyframe_insert(data_path="bevel_factor_end", frame = last)
+        fcurve = curve.animation_data.action.fcurves.find("bevel_factor_end")
+        for keyframe in fcurve.keyframe_points:
+            keyframe.interpolation = 'LINEAR'
         
         return(obj)
 
@@ -185,7 +521,8 @@ class ReferenceLine():
         ''' Create a reference line on the graph'''
         graph_name = 'graph_' + graph
         plot = bpy.data.objects[graph_name]
-        data = plot['plot_data']
+        if plot.get('plot_mode') == 'Texture': # Drawn into the texture
+            return
         
         props = bpy.context.scene.blenderspiky_graphbuild
         name = f'ref_{graph}'
@@ -199,26 +536,17 @@ class ReferenceLine():
         spline.bezier_points.add(1)
         
         x1 = 0
-        x2 = len(data) * SCALE[0] * props.t_scalar
+        x2 = len(plot['plot_data']) * SCALE[0] * props.t_scalar
         
         # ymin = bpy.context.scene.blenderspiky_materials.min_value
         # ymax = bpy.context.scene.blenderspiky_materials.max_value
-        y = (props.ref_height-np.min(data)) * SCALE[1] * props.v_scalar
+        y = (props.ref_height-plot_minimum(plot)) * SCALE[1] * props.v_scalar
         # y = np.clip(ymin, ymax, y)
         
-        #hook to furthest edge of section
-        i=0
-        p = spline.bezier_points[i]
-        p.co = [x1, y, 0]
-        p.handle_right_type = 'AUTO'
-        p.handle_left_type = 'AUTO'
-        
-        #hook to graph origin
-        i=1
-        p = spline.bezier_points[i]
-        p.co = [x2, y, 0]
-        p.handle_right_type = 'AUTO'
-        p.handle_left_type = 'AUTO'
+        for p in spline.bezier_points:
+            p.handle_right_type = 'AUTO'
+            p.handle_left_type = 'AUTO'
+        write_straight_line(spline, (x1, y, 0), (x2, y, 0))
         
         obj.parent = plot
         obj.data.bevel_depth = props.ref_width
@@ -235,16 +563,16 @@ class ReferenceLine():
 
     def remove_ref_line(self, graph):
         ref_line_name = 'ref_' + graph
-        remove_curve(ref_line_name)
+        if ref_line_name in bpy.data.objects: # Texture graphs have none
+            remove_curve(ref_line_name)
 
 class SgCurve():    
     def build_sg_curve(self, graph):
         ''' Create a bezier curve from the NEURON section tip to the graph'''
     
         graph_name = 'graph_' + graph
-        section = bpy.data.objects[graph]
+        section, section_ID = resolve_section(graph)
         plot = bpy.data.objects[graph_name]
-        data = plot['plot_data']
         
         props = bpy.context.scene.blenderspiky_graphbuild
         name = f'sg_{graph}'
@@ -257,25 +585,21 @@ class SgCurve():
         
         spline.bezier_points.add(1)
 
-        empty_loc = bpy.data.objects[graph].parent.location
-        
         #hook to furthest edge of section
         i=0
         p = spline.bezier_points[i]
-        vi = np.argmax([(v.co - empty_loc).length for v in section.data.vertices])
-        p.co = section.data.vertices[vi].co
+        _, p.co = get_section_tips(section)[section_ID]
         p.handle_right_type = 'AUTO'
         p.handle_left_type = 'AUTO'
         h = obj.modifiers.new(section.name, 'HOOK')
         h.object = section
         h.vertex_indices_set([a + i*3 for a in range(3)])
         
-        y = (props.ref_height-np.min(data)) * SCALE[1] * props.v_scalar
+        y = (props.ref_height-plot_minimum(plot)) * SCALE[1] * props.v_scalar
         #hook to graph origin
         i=1
         p = spline.bezier_points[i]
-        p.co = plot.location
-        p.co[1] = p.co[1]+y
+        p.co = (plot.location[0], plot.location[1]+y, plot.location[2])
         p.handle_right_type = 'AUTO'
         p.handle_left_type = 'AUTO'
         h = obj.modifiers.new(plot.name, 'HOOK')
@@ -307,6 +631,8 @@ def update_native_graph(property: str, value: str):
         props = context.scene.blenderspiky_graphbuild
         for graph in props.graphs:
             obj = bpy.data.objects['graph_' + graph.name]
+            if obj.type != 'CURVE': # Texture graph
+                continue
             setattr(obj.data, property, getattr(props, value))
             
     return(func)
@@ -321,38 +647,28 @@ def update_sg_curve(property: str, value: str):
             
     return(func)
 
-def update_line_width(self, context):
+def apply_line_width(self, context):
     update_graphs = update_native_graph('bevel_depth','line_width')
     update_graphs(self,context)
-    
-    update_vt_bars(self, context)
 
-def update_scale(self,context):
+def apply_scale(self,context):
     props = context.scene.blenderspiky_graphbuild
     
     x = props.t_scalar
     y = props.v_scalar
     
-    xp,yp = props.graph_scale
-        
-    matrixp = Matrix.Scale(1/xp, 4, (1.0, 0.0, 0.0)) @ Matrix.Scale(1/yp, 4, (0.0, 1.0, 0.0))
-    matrix  = Matrix.Scale(x   , 4, (1.0, 0.0, 0.0)) @ Matrix.Scale(y   , 4, (0.0, 1.0, 0.0))
-    
+    # Points are recomputed from the pyramid of each trace: a new time scale may switch its level
     for graph in props.graphs:
-        obj = bpy.data.curves['curve_graph_' + graph.name]
-        
-        obj.transform(matrixp)
-        obj.transform(matrix)
-        
-        for p in obj.splines[0].points:
-            p.radius = 1
+        ob = bpy.data.objects['graph_' + graph.name]
+        if ob.get('plot_mode') == 'Texture':
+            continue
+        pyramid = get_pyramid(ob)
+        level = graph_level(pyramid, animated = ob.get('animated', ob.data.animation_data is not None))
+        write_spline_points(ob.data, graph_coordinates(pyramid, level))
+        ob['pyramid_level'] = level
     
     props.graph_scale[0] = x
     props.graph_scale[1] = y
-    
-    update_vt_bars(self,context)
-    update_ref_line(self,context)
-    update_sg_curve(self,context)
 
 def update_object_data(obj_name: str, property: str, value: str, callback=None):
     func = None
@@ -378,7 +694,7 @@ def update_object_data(obj_name: str, property: str, value: str, callback=None):
         
     return(func)
 
-def update_vt_bars(self, context):
+def apply_vt_bars(self, context):
     props = context.scene.blenderspiky_graphbuild
     voltage_bar_name = 'voltage_scale_bar'
     time_bar_name = 'time_scale_bar'
@@ -415,58 +731,54 @@ def update_vt_bars(self, context):
                     text_curve.data.offset_x = x2/2-.5
                     text_curve.data.offset_y = -props.scale_width -.2
                     
-                points = spline.bezier_points
-                points[0].co = (x1,y1, 0)
-                points[1].co = (x2,y2, 0)
+                write_straight_line(spline, (x1,y1, 0), (x2,y2, 0))
                 
                 mat_name = 'mat_' + bar
                 color = props.scale_color
                 mat,_ = set_material_to_object(bar, mat_name)
                 set_material_color(mat_name, color)
 
-def update_graph_color(self, context):
-    '''This function will be called when the graph_color property changes'''
-    # You can access the updated value with self.graph_color
+def apply_graph_color(self, context):
     props = context.scene.blenderspiky_graphbuild
     
-    #change all graphs colors
+    #change all graphs colors (the shared material, and the per-graph ones of older files)
+    mat_names = {GRAPH_MATERIAL}
     for graph in props.graphs:
-        # set the material for the graph object and change the color
-        graph_name = 'graph_' + graph.name
-        mat_name = 'mat_' + graph.name
-        mat,_ = set_material_to_object(graph_name, mat_name)
+        ob = bpy.data.objects.get('graph_' + graph.name)
+        if ob is not None:
+            mat_names.update(mat.name for mat in ob.data.materials if mat is not None)
+    for mat_name in mat_names:
         set_material_color(mat_name, self.graph_color)
-    
-    update_vt_bars(self,context)
 
-def update_ref_line(self, context):
+def apply_ref_line(self, context):
     props = context.scene.blenderspiky_graphbuild
+    if not props.ref_lines:
+        return
     
     for graph in props.graphs:
         name = f'ref_{graph.name}'
-        ref = bpy.data.objects[name]
+        ref = bpy.data.objects.get(name)
+        if ref is None: # Texture graph
+            continue
         
         ref.data.bevel_depth = props.ref_width
         
         #set height now
         graph_name = 'graph_' + graph.name
         plot = bpy.data.objects[graph_name]
-        data = plot['plot_data']
         
         curve = bpy.data.curves['curve_' + name]
         spline = curve.splines[0]
-        points = spline.bezier_points
         
         x1 = 0
-        x2 = len(data) * SCALE[0] * props.t_scalar
+        x2 = len(plot['plot_data']) * SCALE[0] * props.t_scalar
         
         # ymin = bpy.context.scene.blenderspiky_materials.min_value
         # ymax = bpy.context.scene.blenderspiky_materials.max_value
-        y = (props.ref_height-np.min(data)) * SCALE[1] * props.v_scalar
+        y = (props.ref_height-plot_minimum(plot)) * SCALE[1] * props.v_scalar
         # y = np.clip(ymin, ymax, y)
   
-        setattr(points[0], 'co', [x1, y, 0])
-        setattr(points[1], 'co', [x2, y, 0])
+        write_straight_line(spline, (x1, y, 0), (x2, y, 0))
         
         # set the material for the graph-section object and change the color
         ref_name = 'ref_' + graph.name
@@ -474,8 +786,10 @@ def update_ref_line(self, context):
         mat_ref,_ = set_material_to_object(ref_name, mat_ref_name)
         set_material_color(mat_ref_name, self.ref_color)
     
-def update_sg_curve(self, context):
+def apply_sg_curve(self, context):
     props = context.scene.blenderspiky_graphbuild
+    if not props.sg_curves:
+        return
     
     for graph in props.graphs:
         name = f'sg_{graph.name}'
@@ -486,11 +800,10 @@ def update_sg_curve(self, context):
         curve = bpy.data.curves['curve_' + name]
         
         plot = bpy.data.objects['graph_' + graph.name]
-        y = (props.ref_height-np.min(plot['plot_data'])) * SCALE[1] * props.v_scalar
+        y = (props.ref_height-plot_minimum(plot)) * SCALE[1] * props.v_scalar
         p = curve.splines[0].bezier_points[1]
-        p.co = plot.location
-        p.co[1] = plot.location[1]+y
-        curve.splines[0].bezier_points[1].radius = props.sg_thick
+        p.co = (plot.location[0], plot.location[1]+y, plot.location[2])
+        p.radius = props.sg_thick
         
         # set the material for the graph-section object and change the color
         sg_name = 'sg_' + graph.name
@@ -498,22 +811,132 @@ def update_sg_curve(self, context):
         mat_sg,_ = set_material_to_object(sg_name, mat_sg_name)
         set_material_color(mat_sg_name, self.sg_color)
 
+def apply_textures(self, context):
+    props = context.scene.blenderspiky_graphbuild
+    for graph in props.graphs:
+        ob = bpy.data.objects.get('graph_' + graph.name)
+        if ob is not None and ob.get('plot_mode') == 'Texture':
+            rasterize_graph(ob)
+
+## ------------------------------ Update scheduler ------------------------------------------
+
+class GraphUpdateScheduler():
+    '''
+        Coalesces the updates of the graph panel properties.
+
+        A property change only marks aspects of the graphs dirty (with the aspects that depend on it) and pushes
+        back a short timer. While a slider is dragged the timer keeps being pushed back; once it fires, every
+        dirty aspect is applied once to all graphs, however many properties changed.
+    '''
+    DELAY = 0.1 # Seconds without changes before applying
+    
+    # Aspect -> function applying it to all graphs, in the order they are applied
+    APPLY = {
+        'scale': apply_scale,
+        'line_width': apply_line_width,
+        'graph_color': apply_graph_color,
+        'vt_bars': apply_vt_bars,
+        'ref_line': apply_ref_line,
+        'sg_curve': apply_sg_curve,
+        'texture': apply_textures,
+    }
+    
+    # Aspects to reapply when an aspect changes
+    DEPENDENTS = {
+        'scale': ('vt_bars', 'ref_line', 'sg_curve', 'texture'),
+        'line_width': ('vt_bars', 'texture'),
+        'graph_color': ('vt_bars', 'texture'),
+        'vt_bars': ('texture',),
+        'ref_line': ('texture',),
+    }
+    
+    def __init__(self):
+        self.dirty = set()
+        self.deadline = 0.0
+    
+    def schedule(self, aspect):
+        self.dirty.add(aspect)
+        self.dirty.update(self.DEPENDENTS.get(aspect, ()))
+        self.deadline = time.monotonic() + self.DELAY
+        if not bpy.app.timers.is_registered(apply_graph_updates):
+            bpy.app.timers.register(apply_graph_updates, first_interval=self.DELAY)
+    
+    def tick(self):
+        '''Timer callback: seconds until the next call, or None once the updates are applied'''
+        remaining = self.deadline - time.monotonic()
+        if remaining > 0: # Pushed back by a newer change
+            return remaining
+        self.apply()
+        return None
+    
+    def apply(self):
+        '''Apply the dirty aspects now'''
+        dirty, self.dirty = self.dirty, set()
+        props = bpy.context.scene.blenderspiky_graphbuild
+        for aspect,apply in self.APPLY.items():
+            if aspect not in dirty:
+                continue
+            try:
+                apply(props, bpy.context)
+            except KeyError as e: # Graph objects deleted by hand, the other aspects are still applied
+                print("BlenderSpiky: could not update graph {}, missing object {}".format(aspect, e))
+    
+    def cancel(self):
+        self.dirty.clear()
+        if bpy.app.timers.is_registered(apply_graph_updates):
+            bpy.app.timers.unregister(apply_graph_updates)
+
+GRAPH_UPDATES = GraphUpdateScheduler()
+
+def apply_graph_updates():
+    return GRAPH_UPDATES.tick()
+
+# Property callbacks, they only schedule the updates
+def update_scale(self, context):
+    GRAPH_UPDATES.schedule('scale')
+
+def update_line_width(self, context):
+    GRAPH_UPDATES.schedule('line_width')
+
+def update_graph_color(self, context):
+    GRAPH_UPDATES.schedule('graph_color')
+
+def update_vt_bars(self, context):
+    GRAPH_UPDATES.schedule('vt_bars')
+
+def update_ref_line(self, context):
+    GRAPH_UPDATES.schedule('ref_line')
+
+def update_sg_curve(self, context):
+    GRAPH_UPDATES.schedule('sg_curve')
+
+def update_texture(self, context):
+    GRAPH_UPDATES.schedule('texture')
+
 ############################ Properties ########################################
 
 class GraphBuilderProps(bpy.types.PropertyGroup):
     '''
         Property group for holding graph builder parameters
     '''    
-    # plot_mode : bpy.props.EnumProperty(
-    #     name = "MPL or Native",
-    #     description = "Mode of plotting",
-    #     items = [
-    #         ('Native', 'Native', 'Generated from blender objects only, no textures'),           
-    #         ('MPL', 'MPL', 'Matplotlib generated pngs in a texture'),           
-    #     ],
-    #     default = 'Native',
-    #     update=update_plot_mode
-    # )
+    plot_mode : bpy.props.EnumProperty(
+        name = "Native or Texture",
+        description = "Mode of plotting new graphs",
+        items = [
+            ('Native', 'Native', 'Bevelled curves, can be animated'),
+            ('Texture', 'Texture', 'Trace, reference line and scale bars rasterised into an image on a plane'),
+        ],
+        default = 'Native',
+    )
+    
+    texture_resolution : bpy.props.FloatProperty(
+        name="pixels per unit",
+        description="Resolution of the images of texture graphs (a graph is about 100 units high at voltage scale 1)",
+        default = 20,
+        min = 1,
+        soft_max = 200,
+        update=update_texture,
+    )
     
     scale_bars : bpy.props.BoolProperty(
         name="Scale bars",
@@ -637,6 +1060,24 @@ class GraphBuilderProps(bpy.types.PropertyGroup):
         size=2
     )
     
+    graph_resolution : bpy.props.FloatProperty(
+        name="points per unit",
+        description="Most graph points drawn per Blender unit of plot width. Long traces are drawn from a "
+                    "min/max pyramid at the level that fits, spikes stay visible",
+        default = 200,
+        min = 1,
+        soft_max = 2000,
+        update=update_scale,
+    )
+    
+    max_graph_points : bpy.props.IntProperty(
+        name="max points",
+        description="Most points per graph, whatever the width (0: no limit). Animated graphs keep all samples",
+        default = 20000,
+        min = 0,
+        update=update_scale,
+    )
+    
     animate : bpy.props.BoolProperty(
         name="Animate plot",
         default = True,
@@ -650,6 +1091,39 @@ class GraphBuilderProps(bpy.types.PropertyGroup):
         update=update_line_width,
     )
     
+    batch_type : bpy.props.StringProperty(
+        name="Type",
+        description="Only build graphs of sections of this type (e.g. dend, axon). Empty: any type",
+        default="",
+    )
+    
+    batch_IDs : bpy.props.StringProperty(
+        name="IDs",
+        description="Only build graphs of these section IDs, e.g. 0, 4, 10-20. Empty: any ID",
+        default="",
+    )
+    
+    spike_threshold : bpy.props.FloatProperty(
+        name="threshold",
+        description="Spikes are upward crossings of this voltage (mV)",
+        default = 0,
+    )
+    
+    spike_refractory : bpy.props.IntProperty(
+        name="refractory",
+        description="Minimal number of frames between two spikes of a section",
+        default = 5,
+        min = 0,
+    )
+    
+    raster_row_height : bpy.props.FloatProperty(
+        name="row height",
+        description="Distance between the rows (sections) of the raster plot",
+        default = .1,
+        min = 0.001,
+        soft_max = 10,
+    )
+    
     graphs : bpy.props.CollectionProperty(
         type=bpy.types.PropertyGroup,
         name="Graphs"
@@ -691,12 +1165,93 @@ class BLENDERSPIKY_OT_GraphBuilder(bpy.types.Operator):
             out('Please select a NEURON section before building a graph.')
             return {"FINISHED"}
             
-
-        section_graph = SectionGraph()
+        ob = bpy.context.selected_objects[0]
+        if ob.get('merged'): # Single mesh neuron: the section is picked by a selected vertex
+            section_ID = get_selected_section_ID(ob)
+            if section_ID is None:
+                out('Please select a vertex of the section in Edit Mode before building a graph.')
+                return {"FINISHED"}
+            if ob.mode == 'EDIT':
+                bpy.ops.object.mode_set(mode='OBJECT')
+            section_graph = SectionGraph(section_key(ob, section_ID))
+        else:
+            section_graph = SectionGraph()
         
         items = props.graphs
         item = items.add()
-        item.name = section_graph.parent_section.name
+        item.name = section_graph.key
+
+        return {"FINISHED"}
+
+class BLENDERSPIKY_OT_BatchGraphBuilder(bpy.types.Operator):
+    '''
+       Operator to create graphs of all selected sections (or all sections of the selected neurons),
+       filtered by section type and IDs
+    '''
+    
+    bl_idname = 'blenderspiky.build_graphs'
+    bl_label =  'Build graphs of selection'
+    
+    def execute(self, context):
+
+        props = context.scene.blenderspiky_graphbuild
+        try:
+            keys = collect_section_keys(context.selected_objects, props.batch_type.strip(), props.batch_IDs)
+        except ValueError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        existing = {graph.name for graph in props.graphs}
+        keys = [key for key in keys if key not in existing]
+        if not keys:
+            out('No (new) sections match the selection and the filters.')
+            return {"FINISHED"}
+
+        for ob in context.selected_objects: # Vertex selections are read, graphs are built in Object Mode
+            if ob.mode == 'EDIT':
+                bpy.ops.object.mode_set(mode='OBJECT')
+                break
+
+        for graph in build_section_graphs(keys):
+            item = props.graphs.add()
+            item.name = graph.key
+        self.report({"INFO"}, "Built {} graphs".format(len(keys)))
+
+        return {"FINISHED"}
+
+class BLENDERSPIKY_OT_RasterBuilder(bpy.types.Operator):
+    '''
+       Operator to detect the spikes of the selected neurons and draw them as a raster plot,
+       one row per section (filtered by section type and IDs)
+    '''
+    
+    bl_idname = 'blenderspiky.build_raster'
+    bl_label =  'Build spike raster'
+    
+    def execute(self, context):
+
+        props = context.scene.blenderspiky_graphbuild
+        parents = [ob if "filepath" in ob else ob.parent for ob in context.selected_objects
+                   if "filepath" in ob or (ob.parent is not None and "filepath" in ob.parent)]
+        parents = list(dict.fromkeys(parents))
+        if not parents:
+            out('Select a neuron (or one of its sections) first.')
+            return {"FINISHED"}
+        
+        section_type = props.batch_type.strip()
+        try:
+            IDs_allowed = parse_ID_filter(props.batch_IDs)
+        except ValueError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+        n_spikes = 0
+        for parent in parents:
+            spikes = detect_spikes(load_voltage_array(parent), props.spike_threshold, props.spike_refractory)
+            types = get_dataset(parent['filepath'], parent.get('voltage_storage', 'FLOAT32')).types
+            rows = [ID for ID in range(spikes.n_sections)
+                    if (not section_type or types[ID] == section_type) and (IDs_allowed is None or ID in IDs_allowed)]
+            build_raster(parent, spikes, rows)
+            n_spikes += int(spikes.counts[rows].sum())
+        self.report({"INFO"}, "{} spikes in {} neuron(s)".format(n_spikes, len(parents)))
 
         return {"FINISHED"}
 
@@ -713,6 +1268,8 @@ class BLENDERSPIKY_OT_GraphRemover(bpy.types.Operator):
         
         #remove object
         try:
+            if "graph_" + items[self.index].name in bpy.data.objects:
+                forget_pyramid(bpy.data.objects["graph_" + items[self.index].name])
             remove_curve("graph_" + items[self.index].name)
         except:
             out(f'Could not remove object graph object')
@@ -788,8 +1345,7 @@ class BLENDERSPIKY_OT_ScalebarBuilder(bpy.types.Operator):
                 text_curve.offset_y = -props.scale_width -.2
                 
             spline.bezier_points.add(1)
-            spline.bezier_points[0].co = (x1,y1, 0)
-            spline.bezier_points[1].co = (x2,y2, 0)
+            write_straight_line(spline, (x1,y1, 0), (x2,y2, 0))
             
             bpy.context.scene.collection.objects.link(obj)
             obj.select_set(True)
@@ -803,6 +1359,7 @@ class BLENDERSPIKY_OT_ScalebarBuilder(bpy.types.Operator):
             color = props.scale_color
             mat,_ = set_material_to_object(bar, mat_name)
             set_material_color(mat_name, color)
+        GRAPH_UPDATES.schedule('texture') # Scale bars are also drawn into texture graphs
         
         return {'FINISHED'}
 
@@ -822,6 +1379,7 @@ class BLENDERSPIKY_OT_ScalebarRemover(bpy.types.Operator):
         #destroy scale bars
         remove_curve(voltage_bar_name)
         remove_curve(time_bar_name)
+        GRAPH_UPDATES.schedule('texture')
         
         return {'FINISHED'}
 
@@ -880,6 +1438,7 @@ class BLENDERSPIKY_OT_ReferenceBuilder(bpy.types.Operator):
         for graph in props.graphs:
             rl = ReferenceLine()
             rl.build_ref_line(graph.name)
+        GRAPH_UPDATES.schedule('texture') # Reference lines of texture graphs are in their images
             
         return {'FINISHED'}
 
@@ -900,5 +1459,6 @@ class BLENDERSPIKY_OT_ReferenceRemover(bpy.types.Operator):
         for graph in props.graphs:
             rl = ReferenceLine()
             rl.remove_ref_line(graph.name)
+        GRAPH_UPDATES.schedule('texture') # Reference lines of texture graphs are in their images
             
         return {'FINISHED'}
\ No newline at end of file
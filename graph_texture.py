@@ -0,0 +1,74 @@
+'''
+    Rasterisation of graphs into RGBA float buffers (NumPy only), for graphs drawn as textured planes.
+
+    Canvases are (height, width, 4) arrays with the first row at the bottom, the layout of Image.pixels.
+    Coordinates are in pixels (floats), lines are drawn with a width in pixels.
+'''
+import numpy as np
+
+def new_canvas(width, height):
+    '''Transparent canvas'''
+    return np.zeros((height, width, 4), dtype=np.float32)
+
+def draw_rect(canvas, x0, x1, y0, y1, color):
+    '''Fill the pixels of the rectangle [x0, x1] x [y0, y1]'''
+    height, width = canvas.shape[:2]
+    c0, c1 = max(int(np.floor(min(x0, x1))), 0), min(int(np.ceil(max(x0, x1))), width)
+    r0, r1 = max(int(np.floor(min(y0, y1))), 0), min(int(np.ceil(max(y0, y1))), height)
+    canvas[r0:r1, c0:c1] = color
+
+def draw_hline(canvas, y, x0, x1, color, line_width=1.0):
+    draw_rect(canvas, x0, x1, y - line_width/2, y + line_width/2, color)
+
+def draw_vline(canvas, x, y0, y1, color, line_width=1.0):
+    draw_rect(canvas, x - line_width/2, x + line_width/2, y0, y1, color)
+
+def trace_envelope(xs, ys, width):
+    '''
+        (lo, hi) of a polyline (xs ascending) in every pixel column, with -inf/inf where it does not pass.
+        Columns between samples get the interpolated line, columns with many samples their extrema,
+        and every column reaches the last sample of the previous one, so the line stays connected.
+    '''
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    centers = np.arange(max(int(np.ceil(xs[0])), 0), min(int(np.floor(xs[-1])), width-1) + 1)
+    xs_all = np.concatenate([xs, centers])
+    ys_all = np.concatenate([ys, np.interp(centers, xs, ys)])
+    order = np.argsort(xs_all, kind='stable')
+    xs_all, ys_all = xs_all[order], ys_all[order]
+
+    columns = np.floor(xs_all).astype(np.int64)
+    inside = (columns >= 0) & (columns < width)
+    columns, ys_all = columns[inside], ys_all[inside]
+    lo = np.full(width, np.inf)
+    hi = np.full(width, -np.inf)
+    if len(columns) == 0:
+        return lo, hi
+
+    starts = np.flatnonzero(np.r_[True, columns[1:] != columns[:-1]])
+    used = columns[starts]
+    lo[used] = np.minimum.reduceat(ys_all, starts)
+    hi[used] = np.maximum.reduceat(ys_all, starts)
+    last = ys_all[np.r_[starts[1:], len(ys_all)] - 1] # Last sample of every used column
+    lo[used[1:]] = np.minimum(lo[used[1:]], last[:-1])
+    hi[used[1:]] = np.maximum(hi[used[1:]], last[:-1])
+    return lo, hi
+
+def draw_trace(canvas, xs, ys, color, line_width=1.0):
+    '''Draw a polyline through (xs, ys), xs ascending'''
+    if len(xs) == 0:
+        return
+    height, width = canvas.shape[:2]
+    lo, hi = trace_envelope(xs, ys, width)
+
+    half = line_width/2
+    reach = int(np.floor(half)) # Columns the line covers on each side
+    lo_wide, hi_wide = lo.copy(), hi.copy()
+    for shift in range(1, reach+1):
+        lo_wide[shift:] = np.minimum(lo_wide[shift:], lo[:-shift])
+        lo_wide[:-shift] = np.minimum(lo_wide[:-shift], lo[shift:])
+        hi_wide[shift:] = np.maximum(hi_wide[shift:], hi[:-shift])
+        hi_wide[:-shift] = np.maximum(hi_wide[:-shift], hi[shift:])
+
+    rows = np.arange(height)[:, None] + 0.5
+    canvas[(rows >= lo_wide - half) & (rows <= hi_wide + half)] = color
@@ -5,6 +5,7 @@ import matplotlib.pyplot as plt
 import matplotlib
 import seaborn as sns
 import cmasher
+from .dataset import get_dataset
 
 def srgb2lin(s):
     if s <= 0.0404482362771082:
@@ -34,6 +35,80 @@ def get_enum_items():
     cmap_ids = sorted(plt.colormaps())
     return [(i,i,"") for i in cmap_ids]
 
+def add_atlas_lookup_nodes(mat, atlas, location=(-900, 150)):
+    '''
+        Add shader nodes looking up the voltage of the current frame in a voltage atlas image.
+        atlas - layout of the atlas (see voltage_atlas.atlas_layout) with the name of the image under "image".
+        Returns the output socket holding the voltage.
+    '''
+    nodes = mat.node_tree.nodes
+    links = mat.node_tree.links
+    x0, y0 = location
+    math_nodes = []
+
+    def math(operation, a, b, c=None):
+        '''Add a Math node; inputs are sockets or numbers'''
+        node = nodes.new("ShaderNodeMath")
+        node.operation = operation
+        node.location = (x0 - 1600 + 80*len(math_nodes), y0 - 150*(len(math_nodes) % 3))
+        math_nodes.append(node)
+        for k,value in enumerate([a, b, c]):
+            if value is None:
+                continue
+            if isinstance(value, bpy.types.NodeSocket):
+                links.new(value, node.inputs[k])
+            else:
+                node.inputs[k].default_value = value
+        return node.outputs[0]
+
+    # Current frame, driven by the scene frame (a simple expression, evaluated without Python)
+    frame_node = nodes.new("ShaderNodeValue")
+    frame_node.name = "Frame"
+    frame_node.label = "Frame"
+    frame_node.location = (x0 - 2000, y0)
+    driver = frame_node.outputs[0].driver_add("default_value").driver
+    driver.expression = "frame"
+
+    # Static per-vertex (x within a tile, row within a frame)
+    coord_node = nodes.new("ShaderNodeAttribute")
+    coord_node.attribute_name = "AtlasCoord"
+    coord_node.location = (x0 - 2000, y0 - 200)
+    coord_xyz = nodes.new("ShaderNodeSeparateXYZ")
+    coord_xyz.location = (x0 - 1800, y0 - 200)
+    links.new(coord_node.outputs[1], coord_xyz.inputs[0])
+
+    W, R = atlas["tile_width"], atlas["rows_per_frame"]
+    Fpt, tiles_x = atlas["frames_per_tile"], atlas["tiles_x"]
+
+    frame = math("MINIMUM", math("MAXIMUM", frame_node.outputs[0], 0), atlas["n_frames"]-1)
+    tile = math("FLOOR", math("DIVIDE", frame, Fpt), None)
+    frame_in_tile = math("MULTIPLY_ADD", tile, -Fpt, frame)
+    tile_x = math("MODULO", tile, tiles_x)
+    tile_y = math("FLOOR", math("DIVIDE", tile, tiles_x), None)
+
+    u = math("MULTIPLY_ADD", tile_x, W, coord_xyz.outputs[0])
+    u = math("DIVIDE", math("ADD", u, .5), atlas["width"])
+    v = math("MULTIPLY_ADD", tile_y, Fpt*R, coord_xyz.outputs[1])
+    v = math("MULTIPLY_ADD", frame_in_tile, R, v)
+    v = math("DIVIDE", math("ADD", v, .5), atlas["height"])
+
+    uv_node = nodes.new("ShaderNodeCombineXYZ")
+    uv_node.location = (x0 - 400, y0)
+    links.new(u, uv_node.inputs[0])
+    links.new(v, uv_node.inputs[1])
+
+    image_node = nodes.new("ShaderNodeTexImage")
+    image_node.location = (x0 - 250, y0)
+    image_node.image = bpy.data.images[atlas["image"]]
+    image_node.interpolation = "Closest"
+    image_node.extension = "EXTEND"
+    links.new(uv_node.outputs[0], image_node.inputs[0])
+
+    separate_node = nodes.new("ShaderNodeSeparateColor")
+    separate_node.location = (x0, y0)
+    links.new(image_node.outputs[0], separate_node.inputs[0])
+    return separate_node.outputs[0]
+
 def create_material(name = "SectionMaterial",
                      min_voltage_value = -70,
                      max_voltage_value = 20,
@@ -41,8 +116,13 @@ def create_material(name = "SectionMaterial",
                      cmap_start=0,
                      cmap_end=1,
                      emission_strength = 2,
-                     colormap_steps = 10
+                     colormap_steps = 10,
+                     atlas = None
                     ):
+    '''
+        atlas - if given (layout of a voltage atlas, see voltage_atlas.atlas_layout),
+                voltage is looked up in the atlas image at the current frame instead of read from the Voltage attribute
+    '''
 
     cmap = get_cmap_by_name(cmap_name)
     cmap = cmasher.get_sub_cmap(cmap,cmap_start,cmap_end)
@@ -69,10 +149,14 @@ def create_material(name = "SectionMaterial",
         ramp_node.color_ramp.elements[k+1].color = to_blender_color(cmap(p))
     ramp_node.location = (-350,0)
     
-    # Voltage attribute node
-    attribute_node = nodes.new("ShaderNodeAttribute")
-    attribute_node.location=(-900, 150)
-    attribute_node.attribute_name="Voltage"
+    # Voltage attribute node (or voltage atlas lookup)
+    if atlas is None:
+        attribute_node = nodes.new("ShaderNodeAttribute")
+        attribute_node.location=(-900, 150)
+        attribute_node.attribute_name="Voltage"
+        voltage_output = attribute_node.outputs[2]
+    else:
+        voltage_output = add_atlas_lookup_nodes(mat, atlas)
     
     
     # Color limits nodes
@@ -110,7 +194,7 @@ def create_material(name = "SectionMaterial",
     mat.node_tree.links.new(subtract_node_1.outputs[0], divide_node.inputs[0])
     mat.node_tree.links.new(subtract_node_2.outputs[0], divide_node.inputs[1])
     
-    mat.node_tree.links.new(attribute_node.outputs[2], subtract_node_1.inputs[0])
+    mat.node_tree.links.new(voltage_output, subtract_node_1.inputs[0])
     mat.node_tree.links.new(min_clim_node.outputs[0], subtract_node_1.inputs[1])
     
     mat.node_tree.links.new(min_clim_node.outputs[0], subtract_node_2.inputs[1])
@@ -178,7 +262,7 @@ class BLENDERSPIKY_OT_MaterialCreator(bpy.types.Operator):
 
         
 
-        mat = create_material(
+        material_settings = dict(
             min_voltage_value=props.min_value,
             max_voltage_value=props.max_value,
             cmap_name=props.colormap,
@@ -187,13 +271,42 @@ class BLENDERSPIKY_OT_MaterialCreator(bpy.types.Operator):
             emission_strength= props.emission_strength,
             colormap_steps= props.colormap_steps
         )
+        mat = None
 
         # Cleaning all children materials and assigning a new one
 
         for ob in context.selected_objects:
+            if "voltage_atlas" in ob: # Every neuron in atlas mode samples its own atlas image
+                ob_mat = create_material(name="SectionMaterial_" + ob.name,
+                                         atlas=ob["voltage_atlas"].to_dict(),
+                                         **material_settings)
+            else:
+                if mat is None:
+                    mat = create_material(**material_settings)
+                ob_mat = mat
             for sec in ob.children:
                 sec.data.materials.clear()
-                sec.data.materials.append(mat)
+                sec.data.materials.append(ob_mat)
+
+        return {'FINISHED'}
+
+
+class BLENDERSPIKY_OT_AutoRange(bpy.types.Operator):
+    '''
+        Set the voltage limits to the range of the recordings of the selected neurons
+    '''
+
+    bl_idname = 'blenderspiky.auto_range'
+    bl_label = 'Auto range'
+
+    def execute(self, context):
+
+        props = context.scene.blenderspiky_materials
+
+        ranges = [get_dataset(ob["filepath"], ob.get("voltage_storage", "FLOAT32")).voltage_range for ob in context.selected_objects if "filepath" in ob]
+        if ranges:
+            props.min_value = min(r[0] for r in ranges)
+            props.max_value = max(r[1] for r in ranges)
 
         return {'FINISHED'}
 
@@ -0,0 +1,191 @@
+'''
+    Mesh generation with NumPy only (no bpy).
+
+    Meshes are returned in the flat layout of utils.read_mesh_data / utils.write_mesh_data:
+        (co (3*Nverts,), loop_start (Npolys,), loop_total (Npolys,), loop_vertex (Nloops,))
+    together with the exact vertex -> segment index, known from the construction.
+'''
+import numpy as np
+
+## ------------------------------ Tubes ------------------------------------------------------
+
+def _normalize(v):
+    length = np.linalg.norm(v, axis=-1, keepdims=True)
+    return v / np.where(length > 0, length, 1)
+
+def transport_frames(points):
+    '''
+        Tangents, normals and binormals along polylines (..., N, 3), with normals parallel transported
+        from point to point, so consecutive rings are not twisted.
+        A batch of polylines of equal length is transported at once: the loop runs over the N points only.
+    '''
+    points = np.asarray(points, dtype=float)
+    n = points.shape[-2]
+    tangents = np.zeros(points.shape)
+    if n > 1:
+        tangents[...,1:-1,:] = points[...,2:,:] - points[...,:-2,:]
+        tangents[...,0,:] = points[...,1,:] - points[...,0,:]
+        tangents[...,-1,:] = points[...,-1,:] - points[...,-2,:]
+    tangents = _normalize(tangents)
+
+    # Zero length steps (repeated points) keep the previous direction
+    valid = tangents.any(axis=-1)
+    previous = np.maximum.accumulate(np.where(valid, np.arange(n), -1), axis=-1)
+    tangents = np.take_along_axis(tangents, np.maximum(previous, 0)[...,None], axis=-2)
+    tangents[previous < 0] = (0,0,1)
+
+    def helper_axis(t): # Axis least aligned with the tangents
+        return np.eye(3)[np.argmin(np.abs(t), axis=-1)]
+
+    normals = np.empty(points.shape)
+    normals[...,0,:] = _normalize(np.cross(tangents[...,0,:], helper_axis(tangents[...,0,:])))
+    for i in range(1, n):
+        t = tangents[...,i,:]
+        previous_normal = normals[...,i-1,:]
+        normal = previous_normal - np.sum(previous_normal*t, axis=-1, keepdims=True)*t # Project onto the new ring plane
+        reversed_ = np.linalg.norm(normal, axis=-1) < 1e-8 # Reversal of direction
+        if reversed_.any():
+            normal[reversed_] = np.cross(t[reversed_], helper_axis(t[reversed_]))
+        normals[...,i,:] = _normalize(normal)
+    binormals = np.cross(tangents, normals)
+    return tangents, normals, binormals
+
+def tube_connectivity(n, ring_resolution, caps=False):
+    ''' (loop_start, loop_total, loop_vertex) of a tube of n rings, shared by all tubes of that shape '''
+    R = int(ring_resolution)
+    # Quads between consecutive rings, wound so that normals point outwards
+    ring = np.arange(R)
+    a = (np.arange(n-1)[:,None]*R + ring[None,:]).reshape(-1)
+    b = (np.arange(n-1)[:,None]*R + np.roll(ring,-1)[None,:]).reshape(-1)
+    quads = np.stack([a, b, b+R, a+R], axis=1).reshape(-1)
+    loop_vertex = [quads]
+    loop_total = [np.full((n-1)*R, 4)]
+    if caps:
+        loop_vertex += [ring[::-1], (n-1)*R + ring]
+        loop_total += [[R], [R]]
+
+    loop_total = np.concatenate(loop_total).astype(np.int32)
+    loop_start = np.concatenate([[0], np.cumsum(loop_total)[:-1]]).astype(np.int32)
+    return loop_start, loop_total, np.concatenate(loop_vertex).astype(np.int32)
+
+def tube_rings(points, radii, ring_resolution):
+    ''' (..., N, R, 3) ring vertices swept along centrelines (..., N, 3) '''
+    _, normals, binormals = transport_frames(points)
+    angles = np.linspace(0, 2*np.pi, int(ring_resolution), endpoint=False)
+    offsets = (np.cos(angles)[:,None]*normals[...,None,:] + np.sin(angles)[:,None]*binormals[...,None,:])
+    return points[...,None,:] + radii[...,None,None]*offsets
+
+def tube_mesh(points, radii, ring_resolution=12, caps=False):
+    '''
+        Sweep circular cross-sections of ring_resolution vertices along a centreline.
+            points (N,3) - centreline (one ring per point)
+            radii (N,) - ring radii
+            caps - close both ends with an n-gon
+        Vertex p belongs to ring (= segment) p // ring_resolution.
+        Returns (co, loop_start, loop_total, loop_vertex, vert_seg_index)
+    '''
+    points = np.asarray(points, dtype=float)
+    radii = np.asarray(radii, dtype=float)
+    co = tube_rings(points, radii, ring_resolution)
+    loop_start, loop_total, loop_vertex = tube_connectivity(len(points), ring_resolution, caps)
+    vert_seg_index = np.repeat(np.arange(len(points)), int(ring_resolution))
+    return co.reshape(-1).astype(np.float32), loop_start, loop_total, loop_vertex, vert_seg_index
+
+def tube_meshes(points, radii, ring_resolution=12, caps=False):
+    '''
+        tube_mesh of a batch of centrelines of equal length, points (S, N, 3) and radii (S, N), computed together.
+        Returns a list of S meshes, sharing their connectivity arrays.
+    '''
+    points = np.asarray(points, dtype=float)
+    radii = np.asarray(radii, dtype=float)
+    co = tube_rings(points, radii, ring_resolution).reshape(len(points), -1).astype(np.float32)
+    loop_start, loop_total, loop_vertex = tube_connectivity(points.shape[1], ring_resolution, caps)
+    vert_seg_index = np.repeat(np.arange(points.shape[1]), int(ring_resolution))
+    return [(c, loop_start, loop_total, loop_vertex, vert_seg_index) for c in co]
+
+## ------------------------------ Level of detail --------------------------------------------
+
+def lod_ring_resolutions(diameters, max_resolution, min_resolution=3, reference_diameter=None,
+                         projected_diameters=None, pixels_per_vertex=4):
+    '''
+        Ring resolution of each section, proportional to its diameter (the circumference it has to resolve):
+        the thickest section (or reference_diameter) gets max_resolution.
+            projected_diameters - optional on-screen diameters (pixels). A ring then gets at most one vertex
+                                  per pixels_per_vertex pixels of projected circumference.
+    '''
+    diameters = np.asarray(diameters, dtype=float)
+    if reference_diameter is None:
+        reference_diameter = diameters.max() if len(diameters) else 1
+    resolutions = max_resolution * diameters / max(reference_diameter, 1e-12)
+    if projected_diameters is not None:
+        resolutions = np.minimum(resolutions, np.pi*np.asarray(projected_diameters, dtype=float)/pixels_per_vertex)
+    return np.clip(np.ceil(resolutions), min_resolution, max(min_resolution, max_resolution)).astype(int)
+
+def sphere_resolution(ring_resolution):
+    ''' (segments, rings) of a sphere matching a ring resolution (12 -> the default 32x16 UV sphere) '''
+    segments = max(8, -(-int(ring_resolution)*8 // 3))
+    return segments, segments // 2
+
+## ------------------------------ Spheres ----------------------------------------------------
+
+def uv_sphere(center, radius, segments=32, rings=16):
+    '''
+        UV sphere (like bpy.ops.mesh.primitive_uv_sphere_add) of (rings-1) rings of segments vertices, then the two poles.
+        Returns (co, loop_start, loop_total, loop_vertex, vert_seg_index) with all vertices in segment 0.
+    '''
+    theta = np.linspace(0, np.pi, rings+1)[1:-1] # Polar angle of the rings
+    phi = np.linspace(0, 2*np.pi, segments, endpoint=False)
+    ring_co = np.stack([np.sin(theta)[:,None]*np.cos(phi)[None,:],
+                        np.sin(theta)[:,None]*np.sin(phi)[None,:],
+                        np.repeat(np.cos(theta)[:,None], segments, axis=1)], axis=-1).reshape(-1,3)
+    co = np.concatenate([ring_co, [[0,0,1], [0,0,-1]]]) * radius + np.asarray(center, dtype=float)
+
+    S = segments
+    north, south = (rings-1)*S, (rings-1)*S + 1
+    j = np.arange(S)
+    a = (np.arange(rings-2)[:,None]*S + j[None,:]).reshape(-1)
+    b = (np.arange(rings-2)[:,None]*S + np.roll(j,-1)[None,:]).reshape(-1)
+    quads = np.stack([a, a+S, b+S, b], axis=1).reshape(-1)
+    top = np.stack([np.full(S, north), j, np.roll(j,-1)], axis=1).reshape(-1)
+    last = (rings-2)*S
+    bottom = np.stack([np.full(S, south), last + np.roll(j,-1), last + j], axis=1).reshape(-1)
+
+    loop_total = np.concatenate([np.full(len(a), 4), np.full(2*S, 3)]).astype(np.int32)
+    loop_start = np.concatenate([[0], np.cumsum(loop_total)[:-1]]).astype(np.int32)
+    loop_vertex = np.concatenate([quads, top, bottom]).astype(np.int32)
+    return co.reshape(-1).astype(np.float32), loop_start, loop_total, loop_vertex, np.zeros(len(co), dtype=np.intp)
+
+## ------------------------------ Geometry stage ---------------------------------------------
+
+def tube_job(points, radii, ring_resolution, caps=False):
+    return ("tube", np.asarray(points, dtype=np.float32), np.asarray(radii, dtype=np.float32), int(ring_resolution), caps)
+
+def sphere_job(center, radius, segments=32, rings=16):
+    return ("sphere", np.asarray(center, dtype=float), float(radius), int(segments), int(rings))
+
+def compute_mesh(job):
+    ''' Geometry of one job made by tube_job or sphere_job '''
+    kind, *args = job
+    return tube_mesh(*args) if kind == "tube" else uv_sphere(*args)
+
+def compute_meshes(jobs):
+    '''
+        Stage one of a build: the geometry of all jobs, in order.
+        Tubes of the same shape (number of rings, ring resolution, caps) are swept together, so the parallel
+        transport loops over the points of a section once for the whole batch instead of once per section.
+        The result is written into Blender by the caller, on the main thread.
+    '''
+    meshes = [None]*len(jobs)
+    batches = {}
+    for i,job in enumerate(jobs):
+        if job[0] == "tube":
+            _, points, radii, ring_resolution, caps = job
+            batches.setdefault((len(points), ring_resolution, caps), []).append(i)
+        else:
+            meshes[i] = compute_mesh(job)
+    for (_, ring_resolution, caps),indices in batches.items():
+        points = np.stack([jobs[i][1] for i in indices])
+        radii = np.stack([jobs[i][2] for i in indices])
+        for i,mesh in zip(indices, tube_meshes(points, radii, ring_resolution, caps)):
+            meshes[i] = mesh
+    return meshes
@@ -1,6 +1,17 @@
 import bpy
 import numpy as np
-from .utils import linear_interpolation, load_sections_dicts
+from bpy.app.handlers import persistent
+from .utils import resample_ragged, read_mesh_data, write_mesh_data
+from .dataset import get_dataset
+from .dataset_cache import DATASET_CACHE
+from .voltage_store import store_voltage_array
+from .mesh_builder import tube_job, sphere_job, compute_mesh, compute_meshes, lod_ring_resolutions, sphere_resolution
+from .frame_buffer import FrameBuffer
+from .frame_dispatcher import FRAME_DISPATCHER
+from .columnar_format import convert_pickle, is_columnar
+from .voltage_atlas import atlas_layout, atlas_coordinates, create_atlas_image
+from .culling import section_bounds, box_corners, visible_boxes
+from .graph_builder import clear_section_tips
 
 ## ------------------------------ Blender Neuron Segment container ---------------------------
 
@@ -10,19 +21,37 @@ class BlenderSection():
     '''
     def cast_segment_data_to_verts(self, data):
         ''' Function to repeat segment data (Nseg elemements) in a point-by-point basis for mesh '''
-        if self.mesh_Npoints is None:
-             self.calculate_mesh_points()
+        if self.vert_seg_index is None:
+            self.build_vertex_index()
+        return np.take(data, self.vert_seg_index)
+
+    def build_vertex_index(self):
+        '''
+            Precompute the vertex -> segment gather index (and a reusable float32 buffer for the attribute).
+            Meshes generated with NumPy store the exact index in their "segment" attribute.
+            In meshes converted from curves, vertices are laid out along the branch, so vertex p belongs to segment p*Nseg//Npoints.
+            With caps, the first and last blocks of vertices belong to the (edge padded) end segments.
+        '''
+        self.calculate_mesh_points()
+        self.attr_buffer = np.empty(self.mesh_Npoints, dtype=np.float32)
+        if "segment" in self.ob.data.attributes:
+            index = np.empty(self.mesh_Npoints, dtype=np.int32)
+            self.ob.data.attributes["segment"].data.foreach_get("value", index)
+            self.vert_seg_index = index.astype(np.intp)
+            return
+
+        Nseg = self.Nseg+2 if self.with_caps else self.Nseg
+        index = np.arange(self.mesh_Npoints) * Nseg // max(self.mesh_Npoints, 1)
         if self.with_caps:
-            Nseg = self.Nseg+2
-            padded_data = np.pad(data, ((1,1)), mode="edge")
-            return np.array([[i]*(self.mesh_Npoints//Nseg) for i in padded_data]).reshape(-1)
-        return np.array([[i]*(self.mesh_Npoints//self.Nseg) for i in data]).reshape(-1)
+            index = np.clip(index-1, 0, self.Nseg-1)
+        self.vert_seg_index = index.astype(np.intp)
          
     def __init__(self, X, Y, Z, DIAM,
                 branch_ID, type,
                 parent_ob=None, 
                 with_caps=False, 
                 simplify_soma=True,
+                lod=None,
                 ):
         '''
             X,Y,Z - segment-wise coordinates of the branch
@@ -32,6 +61,7 @@ class BlenderSection():
             simplify_soma (Bool) - whether to represent a soma as a sphere with homogeneous voltage. 
                     If true, all points have voltage as the mean across all soma segments in a given frame.
                     If false, treats soma as any other section
+            lod - None, or the level of detail of this object: "VIEWPORT" (light proxy, not rendered) or "RENDER" (full mesh, hidden in the viewport)
         '''
         self.X = X
         self.Y = Y
@@ -41,8 +71,11 @@ class BlenderSection():
         self.type = type
         self.parent_ob = parent_ob
         self.mesh_Npoints = None            # Number of vertices in the actual Blender mesh. Set automatically while building
+        self.vert_seg_index = None          # Vertex -> segment gather index. Set automatically while building
+        self.attr_buffer = None             # Reused float32 buffer for writing the voltage attribute
         self.with_caps = with_caps
         self.simplify_soma = simplify_soma
+        self.lod = lod
         self.Nseg = len(X)
         
         self.assign_UV = False # Whether to assign U value as a Vertex attribute
@@ -96,23 +129,78 @@ class BlenderSection():
         self.ob = branch_ob
         return self.ob
 
-    def build(self, resolution_u=20, bevel_depth = 2):
-        '''Build the section'''
+    def mesh_job(self, ring_resolution, bevel_depth):
+        '''
+            The bpy-free geometry job of this section (see mesh_builder): circular cross-sections swept along
+            the segments, or a sphere for a simplified soma
+
+            ring_resolution - number of vertices of the crosssection circle
+            bevel_depth - thickness of the branch
+        '''
         if self.type=="soma" and self.simplify_soma:
+            center_seg_id = self.Nseg//2
+            soma_coords = np.array([self.X[center_seg_id], self.Y[center_seg_id], self.Z[center_seg_id]])
+            soma_radius = (self.DIAM[center_seg_id]/2)*1.5 # Soma is rendered a bit bigger for vizualization purposes
+            return sphere_job(soma_coords, soma_radius, *sphere_resolution(ring_resolution))
+        points = np.stack([self.X, self.Y, self.Z], axis=1)
+        radii = np.asarray(self.DIAM)/2*bevel_depth
+        return tube_job(points, radii, ring_resolution, caps=self.with_caps)
+
+    def build_mesh(self, ring_resolution, bevel_depth):
+        '''Builds a Section in Blender directly as a mesh, written in one batch'''
+        return self.write_mesh(compute_mesh(self.mesh_job(ring_resolution, bevel_depth)))
+
+    def write_mesh(self, geometry):
+        '''
+            Create the mesh object of the section from precomputed geometry
+            (co, loop_start, loop_total, loop_vertex, vert_seg_index), as returned by mesh_builder
+        '''
+        co, loop_start, loop_total, loop_vertex, index = geometry
+        object_name = "soma" if self.type=="soma" and self.simplify_soma else "{}_{}".format(self.type, self.ID)
+        if self.lod == "RENDER":
+            object_name += "_render"
+
+        mesh = write_mesh_data(bpy.data.meshes.new(object_name), co, loop_start, loop_total, loop_vertex, smooth=True)
+        mesh.attributes.new(name="segment", type="INT", domain="POINT").data.foreach_set("value", index.astype(np.int32))
+
+        self.ob = bpy.data.objects.new(object_name, mesh)
+        bpy.context.collection.objects.link(self.ob) # Adding to collection
+        if self.parent_ob is not None:
+            self.ob.parent = self.parent_ob
+
+        self.mesh_Npoints = len(index)
+        self.vert_seg_index = index.astype(np.intp)
+        self.attr_buffer = np.empty(self.mesh_Npoints, dtype=np.float32)
+        return self.ob
+
+    def build(self, resolution_u=20, bevel_depth = 2, mesh_method="NUMPY", ring_resolution=12, geometry=None):
+        '''
+            Build the section
+            
+            mesh_method - "NUMPY" (mesh generated directly) or "CURVES" (Bezier curves, converted with convert_to_mesh)
+            geometry - precomputed geometry of the "NUMPY" method (see write_mesh)
+        '''
+        if geometry is not None:
+            self.write_mesh(geometry)
+        elif mesh_method == "NUMPY":
+            self.build_mesh(ring_resolution, bevel_depth)
+        elif self.type=="soma" and self.simplify_soma:
             self.build_soma()
         else:
             self.build_curves(resolution_u,bevel_depth)
 
     def convert_to_mesh(self):
         ''' Convert Bezier curves to mesh'''
-        if self.type=="soma" and self.simplify_soma: # No need to a simplified soma, which is already a mesh
-            self.mesh_Npoints = len(self.ob.data.vertices)
-            return 
-
-        # If not a soma
-        bpy.context.view_layer.objects.active = self.ob
-        self.ob.select_set(True)
-        bpy.ops.object.convert(target="MESH")
+        if self.ob.type == 'MESH': # No need to convert a simplified soma or a generated mesh, which are already meshes
+            if self.vert_seg_index is None:
+                self.build_vertex_index()
+            if self.type=="soma" and self.simplify_soma:
+                return
+        else:
+            bpy.context.view_layer.objects.active = self.ob
+            self.ob.select_set(True)
+            bpy.ops.object.convert(target="MESH")
+            self.build_vertex_index()
     
         if self.assign_UV: # Assign UV values if necessary
             UVvalues =  self.cast_segment_data_to_verts(np.linspace(0,1,self.Nseg))
@@ -127,26 +215,128 @@ class BlenderSection():
         self.mesh_Npoints = len(self.ob.data.vertices)
 
     def set_voltage_data(self,data):
-        voltage_attr = self.ob.data.attributes[self.attr_name] # Getting Vertex attribute
-
-        if self.mesh_Npoints is None:
-            self.calculate_mesh_points()
+        if self.vert_seg_index is None:
+            self.build_vertex_index()
             
         # --- If soma - is siplified, its voltage is set to the mean across the section (homogeneous voltage)
         if self.type=="soma" and self.simplify_soma:
-            soma_voltage = np.mean(data)
-            for point in range(self.mesh_Npoints):
-                voltage_attr.data[point].value = soma_voltage
-            return 
-
+            self.attr_buffer.fill(np.mean(data))
         # --- If not a soma - cast segment data to mesh points
-        mesh_animation_data = self.cast_segment_data_to_verts(data)
-        for point in range(self.mesh_Npoints):
-            voltage_attr.data[point].value = mesh_animation_data[point]
+        else:
+            np.take(data, self.vert_seg_index, out=self.attr_buffer)
+
+        self.write_voltage_attribute(self.attr_buffer)
+
+    def write_voltage_attribute(self, values):
+        '''Write a whole (Npoints,) float32 buffer into the voltage attribute in one call'''
+        mesh = self.ob.data
+        mesh.attributes[self.attr_name].data.foreach_set("value", values)
+        mesh.update() # foreach_set does not tag the mesh for redraw
 
     def set_metadata_custom_properties(self):
-        '''Sets section ID as a custom property of the object to be saved in .blend file'''
+        '''Sets section ID (and level of detail) as custom properties of the object to be saved in .blend file'''
         self.ob["ID"] = self.ID
+        if self.lod is not None:
+            self.ob["lod"] = self.lod
+            self.ob.hide_render = self.lod == "VIEWPORT"
+            self.ob.hide_viewport = self.lod == "RENDER"
+
+## ------------------------------ Merged neuron mesh container ------------------------------
+
+class MergedNeuronMesh():
+    '''
+        A Class for representing a whole neuron as a single mesh object in Blender.
+        Every vertex keeps the ID of the section it came from ("ID" attribute) and its segment within
+        that section ("segment" attribute), so the per-frame update is a single gather over all segments.
+    '''
+    def __init__(self, segmentation, parent_ob=None):
+        '''
+            segmentation - number of segments per section (every section is resampled to it)
+            parent_ob (bpy.types.Object) - a Blender parent object (the EMPTY created by BlenderNeuron)
+        '''
+        self.segmentation = segmentation
+        self.parent_ob = parent_ob
+        self.ob = None
+        self.vert_seg_index = None          # Vertex -> (section, segment) flat gather index
+        self.attr_buffer = None             # Reused float32 buffer for writing the voltage attribute
+        self.attr_name = "Voltage"
+
+    def build(self, sections, name, lod=None):
+        '''Join the meshes of already built BlenderSections into one object and remove the originals'''
+        co, loop_start, loop_total, loop_vertex, IDs, segments = [], [], [], [], [], []
+        v_offset, l_offset = 0, 0
+        for sec in sections:
+            sec_co, sec_start, sec_total, sec_vertex = read_mesh_data(sec.ob.data)
+            # Vertices in the space of the parent, as the merged object has no transform of its own
+            # (e.g. the simplified soma is a sphere placed with its object location)
+            to_parent = np.array(sec.ob.matrix_parent_inverse @ sec.ob.matrix_basis, dtype=np.float32)
+            sec_co = sec_co.reshape(-1, 3) @ to_parent[:3, :3].T + to_parent[:3, 3]
+            co.append(sec_co.ravel())
+            loop_start.append(sec_start + l_offset)
+            loop_total.append(sec_total)
+            loop_vertex.append(sec_vertex + v_offset)
+            IDs.append(np.full(sec.mesh_Npoints, sec.ID, dtype=np.int32))
+            segments.append(sec.vert_seg_index.astype(np.int32))
+            v_offset += sec.mesh_Npoints
+            l_offset += len(sec_vertex)
+
+        mesh = bpy.data.meshes.new(name)
+        write_mesh_data(mesh,
+                        np.concatenate(co),
+                        np.concatenate(loop_start),
+                        np.concatenate(loop_total),
+                        np.concatenate(loop_vertex),
+                        smooth=True)
+        mesh.attributes.new(name="ID", type="INT", domain="POINT").data.foreach_set("value", np.concatenate(IDs))
+        mesh.attributes.new(name="segment", type="INT", domain="POINT").data.foreach_set("value", np.concatenate(segments))
+        mesh.attributes.new(name=self.attr_name, type="FLOAT", domain="POINT")
+
+        self.ob = bpy.data.objects.new(name, mesh)
+        bpy.context.collection.objects.link(self.ob)
+        self.ob.parent = self.parent_ob
+        self.ob["merged"] = True
+        if lod is not None:
+            self.ob["lod"] = lod
+            self.ob.hide_render = lod == "VIEWPORT"
+            self.ob.hide_viewport = lod == "RENDER"
+
+        for sec in sections: # The per-section objects are no longer needed
+            sec_mesh = sec.ob.data
+            bpy.data.objects.remove(sec.ob, do_unlink=True)
+            bpy.data.meshes.remove(sec_mesh)
+            sec.ob = None
+
+        self.build_vertex_index()
+        return self.ob
+
+    def reattach(self, ob):
+        '''Reuse an existing merged object (e.g. after reopening the .blend file)'''
+        self.ob = ob
+        self.build_vertex_index()
+
+    def build_vertex_index(self):
+        '''Precompute the flat gather index (ID*segmentation + segment) from the mesh attributes'''
+        attributes = self.ob.data.attributes
+        Npoints = len(self.ob.data.vertices)
+        IDs = np.empty(Npoints, dtype=np.int32)
+        segments = np.empty(Npoints, dtype=np.int32)
+        attributes["ID"].data.foreach_get("value", IDs)
+        attributes["segment"].data.foreach_get("value", segments)
+        self.vert_seg_index = IDs.astype(np.intp)*self.segmentation + segments
+        self.attr_buffer = np.empty(Npoints, dtype=np.float32)
+
+    def set_voltage_data(self, segment_data):
+        '''
+            segment_data - (Nsections, segmentation) array of interpolated segment voltages for one frame
+        '''
+        np.take(np.asarray(segment_data).reshape(-1), self.vert_seg_index, out=self.attr_buffer)
+        self.write_voltage_attribute(self.attr_buffer)
+
+    def write_voltage_attribute(self, values):
+        '''Write a whole (Npoints,) float32 buffer into the voltage attribute in one call'''
+        mesh = self.ob.data
+        mesh.attributes[self.attr_name].data.foreach_set("value", values)
+        mesh.update() # foreach_set does not tag the mesh for redraw
 
 ## ------------------------------ Blender Neuron container -----------------------------------
 
@@ -164,7 +354,23 @@ class BlenderNeuron():
                 parent_ob = None,
                 DOWNSCALE_FACTOR=25,
                 branch_base_thickness=2,
-                branch_thickness_homogeneity=0
+                branch_thickness_homogeneity=0,
+                merge_sections=False,
+                mesh_method="NUMPY",
+                ring_resolution=12,
+                use_lod=False,
+                viewport_resolution=6,
+                min_ring_resolution=4,
+                camera_lod=False,
+                skip_unchanged=False,
+                update_tolerance=0.1,
+                voltage_storage="FLOAT32",
+                cull_offscreen=False,
+                cull_min_pixels=1.0,
+                cull_margin=0.1,
+                voltage_mode="HANDLER",
+                precompute_frames=False,
+                frame_budget=512
                 ):
         self.filepath = filepath
         self.name = name
@@ -175,17 +381,43 @@ class BlenderNeuron():
         self.DOWNSCALE_FACTOR = DOWNSCALE_FACTOR
         self.branch_base_thickness = branch_base_thickness
         self.branch_thickness_homogeneity = branch_thickness_homogeneity
+        self.merge_sections = merge_sections # Whether to emit the whole neuron as a single mesh
+        self.mesh_method = mesh_method # "NUMPY" (direct tube mesh) or "CURVES" (Bezier curves converted to mesh)
+        self.ring_resolution = ring_resolution # Vertices per cross-section of generated meshes (of the thickest section, with LOD)
+        self.use_lod = use_lod and mesh_method == "NUMPY" # Whether to build a light viewport proxy and a full resolution render mesh, with ring resolutions following the diameter (generated meshes only)
+        self.viewport_resolution = viewport_resolution # Ring resolution of the thickest section of the viewport proxy
+        self.min_ring_resolution = min_ring_resolution # Ring resolution of the thinnest sections
+        self.camera_lod = camera_lod # Whether to also limit render ring resolutions by the on-screen size of sections
+        self.skip_unchanged = skip_unchanged # Whether frame updates skip the sections whose voltages did not change
+        self.update_tolerance = update_tolerance # Voltage changes below it (mV) do not need an update, with skip_unchanged
+        self.voltage_storage = voltage_storage # "FLOAT32", "FLOAT16" or "INT16" (per-section scale and offset), for .pickle recordings
+        self.cull_offscreen = cull_offscreen # Whether renders skip the sections outside of the camera view (or too small)
+        self.cull_min_pixels = cull_min_pixels # Sections covering fewer pixels are not updated, with cull_offscreen
+        self.cull_margin = cull_margin # Relative widening of the camera frustum, with cull_offscreen
+        self.voltage_mode = voltage_mode # "HANDLER" (frame handler writes the Voltage attribute) or "ATLAS" (shader lookup)
+        self.precompute_frames = precompute_frames # Whether to precompute per-vertex voltages of all frames
+        self.frame_budget = frame_budget # Memory budget of the precomputed frames (MB)
 
 
         self.ALL_SECTIONS = []
+        self.MERGED = None # MergedNeuronMesh, if the neuron is built as a single mesh
+        self.frame_buffer = None # FrameBuffer, if per-vertex voltages are precomputed
+        self.resampled_morphology = None # (Nsections, [X,Y,Z,DIAM], segmentation), set by resample_morphology
+        self.levels = {} # Level of detail -> state of its objects (see use_level), with LOD
+        self.active_level = None
+        self.layout_index = None # Vertex layout of the active level (see build_vertex_layout)
+        self.layout_slices = []
+        self.section_frames = None # (Nsections,) frame shown by each section of the active level, -1 if never written
+        self.section_runs = None # (Nsections, Nframes) change counters (see NeuronDataset.section_runs), if unchanged sections are skipped
+        self.skipped_sections = 0 # Sections left untouched in the last update
+        self.section_corners = None # (Nsections, 8, 3) bounding box corners, for culling
+        self.culling_key = None # Camera and placement the visibility below was computed for
+        self.visible_sections = None
 
 
-        self.sections_dicts = load_sections_dicts(self.filepath) # Loading sections dictionary
-        self.voltage_array = []
-        for i in range(len(self.sections_dicts)):
-            data = self.sections_dicts[i]["Voltage"]
-            branch_voltage_array = np.array( [np.mean(data[f]) for f in range(len(data))] )
-            self.voltage_array.append(branch_voltage_array)
+        self.dataset = get_dataset(self.filepath, voltage_storage) # Loading sections data (.pickle or columnar .bspk) as a shared NeuronDataset
+        self.voltage_storage = self.dataset.storage # Columnar recordings keep the storage they were converted with
+        self.voltage_array = self.dataset.section_means
         
         # self.array_name = "Voltage array" # Name of the custom attribute
 
@@ -200,12 +432,12 @@ class BlenderNeuron():
         self.calculate_center_of_mass()
 
     def calculate_mean_branch_thickness(self):
-        self.mean_branch_thickness = np.mean(np.array([np.mean(self.sections_dicts[k]["DIAM"]) for k in range(len(self.sections_dicts))]))
+        self.mean_branch_thickness = np.mean(self.dataset.section_mean_diameters())
 
     def calculate_center_of_mass(self):
         self.center_of_mass = [0,0,0]
         # if self.center_at_origin:
-        #     self.center_of_mass = [np.mean([np.mean(self.sections_dicts[k][coord]) for k in range(len(self.sections_dicts))]) for coord in ["X","Y","Z"]]
+        #     self.center_of_mass = [np.mean(np.add.reduceat(getattr(self.dataset, coord), self.dataset.point_offsets[:-1]) / np.diff(self.dataset.point_offsets)) for coord in ["X","Y","Z"]]
         # print("Center of mass", self.center_of_mass)
 
 
@@ -219,91 +451,428 @@ class BlenderNeuron():
                          "DOWNSCALE_FACTOR",
                          "branch_base_thickness",
                          "branch_thickness_homogeneity",
-                         "voltage_array"]
+                         "merge_sections",
+                         "mesh_method",
+                         "ring_resolution",
+                         "use_lod",
+                         "viewport_resolution",
+                         "min_ring_resolution",
+                         "camera_lod",
+                         "voltage_mode",
+                         "precompute_frames",
+                         "skip_unchanged",
+                         "update_tolerance",
+                         "voltage_storage",
+                         "cull_offscreen",
+                         "cull_min_pixels",
+                         "cull_margin",
+                         "frame_budget"]
         for attr in attrs_to_save:
             self.parent_ob[attr] = getattr(self, attr)
+        store_voltage_array(self.parent_ob, self.voltage_array) # Compact float32 blob instead of nested IDProperty arrays
+        self.parent_ob["quantisation_error"] = self.dataset.quantisation_error
+        if self.voltage_storage != "FLOAT32":
+            print("{} voltage storage: decoding error <= {:.4g} mV".format(self.voltage_storage, self.dataset.quantisation_error))
 
     def create_parent_empty(self):
         ''' Create a parent EMPTY Blender object, which holds metadata'''
 
         print("Creating parent object")
-        bpy.ops.object.empty_add(type='ARROWS',location=(self.sections_dicts[0]["X"][0],self.sections_dicts[0]["Y"][0],self.sections_dicts[0]["Z"][0]), rotation=(0, 0, 0))
+        bpy.ops.object.empty_add(type='ARROWS',location=(self.dataset.X[0],self.dataset.Y[0],self.dataset.Z[0]), rotation=(0, 0, 0))
         self.parent_ob = bpy.context.selected_objects[0]
         self.parent_ob.name = self.name
 
-    def set_section_voltage_array(self):
-        return NotImplementedError
-        #first make an array of all the mean section voltage values
-        self.parent_ob.data.attributes.new(name=self.array_name,  type="FLOAT2", domain="POINT")
-        voltage_array = self.parent_ob.data.attributes[self.array_name] # Getting Vertex attribute
-        
-        for i in range(len(self.sections_dicts)):
-            data = self.sections_dicts[i]["Voltage"]
-            branch_voltage_array = np.array( [np.mean(data[f]) for f in range(len(data))] )
-            
-            for j,v in enumerate(branch_voltage_array):
-                voltage_array.data[i][j].value = v
-        
     def get_voltage_data(self,branch_ID, frame):
         #return data for section material animation 
-        return self.sections_dicts[branch_ID]["Voltage"][frame]
+        offsets = self.dataset.segment_offsets
+        return self.dataset.voltage_rows(frame, frame+1)[0, offsets[branch_ID]:offsets[branch_ID+1]]
+
+    def resample_morphology(self):
+        '''
+            Resample coordinates and diameters of all sections with the specified resolution (segmentation).
+            Sections with the same number of NEURON points are resampled together in one matmul.
+            The result is shared through the dataset cache with every neuron built with the same parameters.
+        '''
+        params = ("morphology", self.segmentation, self.DOWNSCALE_FACTOR, self.branch_thickness_homogeneity,
+                  tuple(self.center_of_mass))
+        self.resampled_morphology = DATASET_CACHE.get(bpy.path.abspath(self.filepath), self._resample_morphology, params)
+
+    def _resample_morphology(self):
+        morphologies = []
+        for k in range(self.dataset.n_sections):
+            X,Y,Z,DIAM = self.dataset.section_points(k)
+            raw_diam = np.asarray(DIAM, dtype=float) / self.DOWNSCALE_FACTOR
+            scaled_diam = self.branch_thickness_homogeneity*self.mean_branch_thickness + (1-self.branch_thickness_homogeneity)*raw_diam
+            morphologies.append(np.array([
+                (np.asarray(X, dtype=float) - self.center_of_mass[0]) / self.DOWNSCALE_FACTOR,
+                (np.asarray(Y, dtype=float) - self.center_of_mass[1]) / self.DOWNSCALE_FACTOR,
+                (np.asarray(Z, dtype=float) - self.center_of_mass[2]) / self.DOWNSCALE_FACTOR,
+                scaled_diam]))
+        return resample_ragged(morphologies, self.segmentation) # (Nsections, 4, segmentation)
 
     def get_branch_coordinates(self,branch_ID):
-        branch_dict = self.sections_dicts[branch_ID]
         # Blender coordinates for Bezier points are constructed by interpolating the sourse NEURON array of coordinates with specified resolution (segmentation)
-
-        X = linear_interpolation((branch_dict["X"] - self.center_of_mass[0])/ self.DOWNSCALE_FACTOR, self.segmentation) # X coordinates of segments
-        Y = linear_interpolation((branch_dict["Y"] - self.center_of_mass[1]) / self.DOWNSCALE_FACTOR, self.segmentation)  # Y coordinates of segments
-        Z = linear_interpolation((branch_dict["Z"] - self.center_of_mass[2])/ self.DOWNSCALE_FACTOR , self.segmentation) # Z coordinates of segments
+        if self.resampled_morphology is None:
+            self.resample_morphology()
+        X,Y,Z = self.resampled_morphology[branch_ID,:3] # X,Y,Z coordinates of segments
         return [X,Y,Z]
 
     def get_branch_diam(self, branch_ID):
-        branch_dict = self.sections_dicts[branch_ID]
-        raw_diam = branch_dict["DIAM"] / self.DOWNSCALE_FACTOR
-        scaled_diam = self.branch_thickness_homogeneity*self.mean_branch_thickness + (1-self.branch_thickness_homogeneity)*raw_diam
-        return linear_interpolation(scaled_diam, self.segmentation) # segment diameters
+        if self.resampled_morphology is None:
+            self.resample_morphology()
+        return self.resampled_morphology[branch_ID,3] # segment diameters
 
     def get_branch_type(self, branch_ID):
-        return self.sections_dicts[branch_ID]["type"]
+        return self.dataset.types[branch_ID]
 
-    def build_branches(self):
-        for i in range(len(self.sections_dicts)):
+    def projected_section_diameters(self, scene):
+        '''On-screen diameters (pixels) of all sections, seen from the scene camera'''
+        camera = scene.camera
+        render = scene.render
+        width = render.resolution_x*render.resolution_percentage/100
+
+        centers = self.resampled_morphology[:,:3].mean(axis=2) # (Nsections, 3), local coordinates
+        diameters = self.resampled_morphology[:,3].mean(axis=1)*self.branch_base_thickness
+        M = np.array(self.parent_ob.matrix_world)
+        centers = centers @ M[:3,:3].T + M[:3,3]
+        diameters = diameters*np.abs(np.linalg.det(M[:3,:3]))**(1/3)
+
+        if camera.data.type == 'ORTHO':
+            return diameters*width/camera.data.ortho_scale
+        distances = np.linalg.norm(centers - np.array(camera.matrix_world.translation), axis=1)
+        focal_px = camera.data.lens/camera.data.sensor_width*width
+        return diameters*focal_px/np.maximum(distances, 1e-6)
+
+    def get_ring_resolutions(self, max_resolution, projected=False):
+        '''Ring resolution of every section: max_resolution without LOD, else following the section diameters'''
+        if self.resampled_morphology is None:
+            self.resample_morphology()
+        if not self.use_lod:
+            return np.full(self.dataset.n_sections, max_resolution)
+        projected_diameters = None
+        if projected and self.camera_lod and bpy.context.scene.camera is not None:
+            projected_diameters = self.projected_section_diameters(bpy.context.scene)
+        return lod_ring_resolutions(self.resampled_morphology[:,3].mean(axis=1), max_resolution,
+                                    min_resolution=min(self.min_ring_resolution, max_resolution),
+                                    projected_diameters=projected_diameters)
+
+    def build_sections(self, ring_resolutions, lod=None):
+        '''
+            Build one object per section, with the given ring resolutions.
+            With the "NUMPY" method, the geometry of all sections is computed first (bpy-free, tubes of the same shape in batches),
+            then the main thread only bulk-writes the finished arrays into Blender.
+        '''
+        sections = []
+        for i in range(self.dataset.n_sections):
             X,Y,Z = self.get_branch_coordinates(i)
             DIAM = self.get_branch_diam(i)
-            section = BlenderSection(
+            sections.append(BlenderSection(
                                     X,Y,Z,DIAM,
                                     branch_ID=i,
                                     type=self.get_branch_type(i),
                                     parent_ob=self.parent_ob, 
                                     with_caps=self.with_caps,
-                                    simplify_soma=self.simplify_soma)
+                                    simplify_soma=self.simplify_soma,
+                                    lod=lod))
 
-            section.build(bevel_depth=self.branch_base_thickness)
+        geometries = [None]*len(sections)
+        if self.mesh_method == "NUMPY":
+            jobs = [section.mesh_job(int(ring_resolutions[i]), self.branch_base_thickness) for i,section in enumerate(sections)]
+            geometries = compute_meshes(jobs)
+
+        for i,section in enumerate(sections):
+            section.build(bevel_depth=self.branch_base_thickness,
+                          mesh_method=self.mesh_method,
+                          ring_resolution=int(ring_resolutions[i]),
+                          geometry=geometries[i])
             section.convert_to_mesh()
             section.create_voltage_attribute()
             section.set_metadata_custom_properties()
-            self.ALL_SECTIONS.append(section)
+        return sections
 
-    def voltage_handler(self,scene,*args):
-        frame = scene.frame_current
-        for k,sec in enumerate(self.ALL_SECTIONS):
-            voltage_data = linear_interpolation(self.get_voltage_data(k, frame), self.segmentation) # Interpolating from source voltage data depending on segmentation
+    def build_branches(self):
+        if not self.use_lod:
+            self.ALL_SECTIONS = self.build_sections(self.get_ring_resolutions(self.ring_resolution))
+            if self.merge_sections:
+                self.merge_branches()
+            return
+
+        # Full resolution mesh for final render, then the light proxy shown in the viewport
+        for level,resolution in [("RENDER", self.ring_resolution), ("VIEWPORT", self.viewport_resolution)]:
+            self.use_level(level)
+            self.ALL_SECTIONS = self.build_sections(self.get_ring_resolutions(resolution, projected=level=="RENDER"), lod=level)
+            print("LOD {}: {} vertices".format(level, sum(sec.mesh_Npoints for sec in self.ALL_SECTIONS)))
+            if self.merge_sections:
+                self.merge_branches()
+
+    def lod_levels(self):
+        '''Levels of detail of the neuron (None if it is built at a single level)'''
+        return ["RENDER", "VIEWPORT"] if self.use_lod else [None]
+
+    def use_level(self, level):
+        '''
+            Make a level of detail the one played back, built or written: its sections, merged mesh,
+            vertex layout and frame buffer are swapped in, the ones of the previous level are stored
+        '''
+        if level == self.active_level:
+            return
+        state = ["ALL_SECTIONS", "MERGED", "frame_buffer", "layout_index", "layout_slices", "section_frames"]
+        if self.active_level is not None:
+            self.levels[self.active_level] = {attr: getattr(self, attr, None) for attr in state}
+        stored = self.levels.get(level, {"ALL_SECTIONS": [], "MERGED": None, "frame_buffer": None})
+        for attr in state:
+            setattr(self, attr, stored.get(attr))
+        self.active_level = level
+
+    def get_simplified_IDs(self):
+        '''IDs of sections rendered with a homogeneous (mean) voltage'''
+        if not self.simplify_soma:
+            return []
+        return [k for k in range(self.dataset.n_sections) if self.get_branch_type(k)=="soma"]
+
+    def merge_branches(self):
+        '''Replace the per-section objects by a single mesh with one Voltage attribute'''
+        self.MERGED = MergedNeuronMesh(self.segmentation, parent_ob=self.parent_ob)
+        name = "{}_mesh_render".format(self.name) if self.active_level == "RENDER" else "{}_mesh".format(self.name)
+        self.MERGED.build(self.ALL_SECTIONS, name, lod=self.active_level)
+
+    def get_segment_data(self, frame):
+        '''
+            Interpolated voltages of all sections for one frame, as a (Nsections, segmentation) array.
+            Simplified sections get their mean voltage on all segments.
+        '''
+        return self.compute_segment_frames(frame, frame+1).reshape(self.dataset.n_sections, self.segmentation)
+
+    def get_n_frames(self):
+        return self.dataset.n_frames
+
+    def build_vertex_layout(self):
+        '''
+            Concatenate the gather indices of all sections (or take the merged one) into a single vertex layout:
+            one row of per-vertex values covers every vertex of the neuron, section after section
+        '''
+        if self.MERGED is not None:
+            self.layout_index = self.MERGED.vert_seg_index
+            self.layout_slices = []
+            return
+
+        indices = []
+        self.layout_slices = [] # (section, start, stop) of each section in a row
+        offset = 0
+        for sec in self.ALL_SECTIONS:
+            if not isinstance(sec, BlenderSection): # Missing children after reinstantiation
+                continue
+            if sec.vert_seg_index is None:
+                sec.build_vertex_index()
+            indices.append(sec.ID*self.segmentation + sec.vert_seg_index)
+            self.layout_slices.append((sec, offset, offset+sec.mesh_Npoints))
+            offset += sec.mesh_Npoints
+        self.layout_index = np.concatenate(indices) if indices else np.zeros(0, dtype=np.intp)
+
+    def compute_segment_frames(self, start, stop):
+        '''Interpolated segment voltages of frames [start, stop), as a (frames, Nsections*segmentation) array'''
+        # All frames of all sections are resampled at once, (Nsections, frames, segmentation)
+        rows = self.dataset.voltage_rows(start, stop)
+        offsets = self.dataset.segment_offsets
+        segment_data = resample_ragged([rows[:, offsets[k]:offsets[k+1]] for k in range(self.dataset.n_sections)],
+                                       self.segmentation)
+        for ID in self.get_simplified_IDs():
+            segment_data[ID] = np.mean(segment_data[ID], axis=1, keepdims=True)
+        return segment_data.transpose(1,0,2).reshape(stop-start, -1).astype(np.float32)
+
+    def compute_vertex_frames(self, start, stop):
+        '''Per-vertex voltages of frames [start, stop) in the vertex layout, as a float32 array'''
+        rows = np.empty((stop-start, len(self.layout_index)), dtype=np.float32)
+        np.take(self.compute_segment_frames(start, stop), self.layout_index, axis=1, out=rows)
+        return rows
+
+    def build_voltage_atlas(self):
+        '''
+            Pack the segment voltages of all frames into a float image (voltage atlas) and give every vertex
+            its static atlas coordinate ("AtlasCoord" attribute). A material created with the atlas looks the
+            voltage up at the current frame, so playback and rendering need no frame handler.
+        '''
+        n_frames = self.get_n_frames()
+        n_columns = self.dataset.n_sections*self.segmentation
+        layout = atlas_layout(n_columns, n_frames)
+        layout["image"] = create_atlas_image("{}_voltage_atlas".format(self.name),
+                                             self.compute_segment_frames(0, n_frames), layout).name
+        self.parent_ob["voltage_atlas"] = layout
+
+        for level in self.lod_levels(): # Both levels of detail sample the same atlas
+            self.use_level(level)
+            self.build_vertex_layout()
+            coordinates = atlas_coordinates(self.layout_index, layout)
+            if self.MERGED is not None:
+                targets = [(self.MERGED.ob, 0, len(coordinates))]
+            else:
+                targets = [(sec.ob, start, stop) for sec,start,stop in self.layout_slices]
+            for ob,start,stop in targets:
+                attribute = ob.data.attributes.new(name="AtlasCoord", type="FLOAT2", domain="POINT")
+                attribute.data.foreach_set("vector", coordinates[start:stop].reshape(-1))
+        print("Voltage atlas: {}x{} px".format(layout["width"], layout["height"]))
+
+    def precompute_frame_buffer(self, budget_MB=512):
+        '''
+            Precompute per-vertex voltages of all frames, so the handler only has to look up a row.
+            If they do not fit in budget_MB, frames are computed on demand and the recent ones are kept.
+            With LOD, the budget is shared by the levels of detail.
+        '''
+        levels = self.lod_levels()
+        for level in levels:
+            self.use_level(level)
+            self.build_vertex_layout()
+            self.frame_buffer = FrameBuffer(self.compute_vertex_frames,
+                                            n_frames=self.get_n_frames(),
+                                            n_verts=len(self.layout_index),
+                                            budget_bytes=int(budget_MB*2**20/len(levels)))
+            print("Frame buffer: {} ({:.1f} MB)".format("full" if self.frame_buffer.full else "on demand",
+                                                         self.frame_buffer.nbytes/2**20))
+
+    def write_vertex_frame(self, row, dirty=None):
+        '''
+            Write one row of the vertex layout into the voltage attributes
+            dirty - optional (Nsections,) bool array, only the meshes of these sections are written (and tagged for update)
+        '''
+        if self.MERGED is not None:
             try:
-                sec.set_voltage_data(voltage_data)
+                self.MERGED.write_voltage_attribute(row)
+            except ReferenceError:
+                pass # In case the merged object was deleted
+            return
+        for sec,start,stop in self.layout_slices:
+            if dirty is not None and not dirty[sec.ID]:
+                continue
+            try:
+                sec.write_voltage_attribute(row[start:stop])
             except:
                 continue # In case the section object was deleted
 
+    def segment_row_key(self):
+        '''Neurons with the same key have the same segment voltages in every frame'''
+        return (id(self.dataset), self.segmentation, self.simplify_soma)
+
+    def update_frame(self, frame, segment_rows=None, rendering=False, scene=None):
+        '''
+            Write the voltages of one frame into the attributes of the active level of detail.
+            segment_rows - dict of segment voltage rows shared by the neurons updated for the same frame (see segment_row_key)
+            scene - needed for culling the sections outside of the camera view while rendering
+        '''
+        if self.use_lod: # The full resolution mesh is only written while rendering
+            self.use_level("RENDER" if rendering else "VIEWPORT")
+        if not 0 <= frame < self.get_n_frames(): # Outside of the recording
+            return
+
+        write = self.get_dirty_sections(frame)
+        # With motion blur the sections are also seen from the camera at other subframes, so nothing is culled
+        if (rendering and self.cull_offscreen and scene is not None and scene.camera is not None
+                and not scene.render.use_motion_blur):
+            write &= self.get_visible_sections(scene) # Culled sections stay dirty until they are seen
+        if self.MERGED is not None and write.any():
+            write[:] = True # A merged mesh is written as a whole
+        self.skipped_sections = int(len(write) - np.count_nonzero(write))
+        if not write.any():
+            return
+
+        if self.frame_buffer is not None:
+            row = self.frame_buffer.get(frame)
+        else:
+            segment_rows = {} if segment_rows is None else segment_rows
+            key = self.segment_row_key()
+            if key not in segment_rows: # Interpolating from source voltage data depending on segmentation
+                segment_rows[key] = self.compute_segment_frames(frame, frame+1)[0]
+            if self.layout_index is None:
+                self.build_vertex_layout()
+            row = np.take(segment_rows[key], self.layout_index)
+        self.write_vertex_frame(row, write)
+        self.section_frames[write] = frame
+
+    def get_dirty_sections(self, frame):
+        '''
+            (Nsections,) bool array of the sections that have to be written for this frame: all of them,
+            or with skip_unchanged, those whose voltages changed (beyond the update tolerance) since the frame they show
+        '''
+        n_sections = self.dataset.n_sections
+        if self.section_frames is None:
+            self.section_frames = np.full(n_sections, -1)
+        if self.section_runs is None:
+            return np.ones(n_sections, dtype=bool)
+        shown = np.maximum(self.section_frames, 0)
+        return (self.section_frames < 0) | (self.section_runs[:, frame] != self.section_runs[np.arange(n_sections), shown])
+
+    def get_visible_sections(self, scene):
+        '''
+            (Nsections,) bool array of the sections that may be seen by the scene camera, and are large enough on screen.
+            Cached while the camera, the render settings and the neuron do not move.
+            Only the camera of the current frame is tested, so it is not used with motion blur (see update_frame).
+        '''
+        camera, render = scene.camera, scene.render
+        cam = camera.data
+        width = render.resolution_x*render.resolution_percentage/100*render.pixel_aspect_x
+        height = render.resolution_y*render.resolution_percentage/100*render.pixel_aspect_y
+        # Conservative for lens shift: the frustum is widened further
+        margin = self.cull_margin + 2*max(abs(cam.shift_x), abs(cam.shift_y))
+
+        key = (tuple(map(tuple, camera.matrix_world)), tuple(map(tuple, self.parent_ob.matrix_world)),
+               cam.type, cam.lens, cam.sensor_fit, cam.sensor_width, cam.sensor_height, cam.ortho_scale,
+               cam.clip_start, cam.clip_end, width, height, margin, self.cull_min_pixels)
+        if key == self.culling_key:
+            return self.visible_sections
+
+        if self.section_corners is None:
+            if self.resampled_morphology is None:
+                self.resample_morphology()
+            radius_factor = max(self.branch_base_thickness, 1.5) # Branch bevel or simplified soma
+            self.section_corners = box_corners(section_bounds(self.resampled_morphology, radius_factor))
+        M = np.array(camera.matrix_world.inverted() @ self.parent_ob.matrix_world)
+        corners = self.section_corners @ M[:3,:3].T + M[:3,3]
+
+        ortho = cam.type == 'ORTHO'
+        horizontal = cam.sensor_fit == 'HORIZONTAL' or (cam.sensor_fit == 'AUTO' and width >= height)
+        sensor = cam.sensor_width if cam.sensor_fit != 'VERTICAL' else cam.sensor_height
+        half_fit = cam.ortho_scale/2 if ortho else sensor/2/cam.lens
+        if horizontal:
+            half_width, half_height = half_fit, half_fit*height/width
+        else:
+            half_width, half_height = half_fit*width/height, half_fit
+
+        self.visible_sections = visible_boxes(corners, half_width, half_height, cam.clip_start, cam.clip_end, ortho=ortho,
+                                              pixels_per_unit=width/2/half_width, min_pixels=self.cull_min_pixels,
+                                              margin=margin)
+        self.culling_key = key
+        return self.visible_sections
+
+    def voltage_handler(self,scene,*args):
+        self.update_frame(scene.frame_current, rendering=FRAME_DISPATCHER.rendering, scene=scene)
+
     def add_voltage_handler(self):
-        bpy.app.handlers.frame_change_post.append(self.voltage_handler)
-        bpy.context.scene.render.use_lock_interface = True # This is to ensure render doesn't crash
+        '''Register the neuron in the frame dispatcher, which runs one handler for all neurons'''
+        for level in self.lod_levels():
+            self.use_level(level)
+            self.build_vertex_layout()
+        if "animate" not in self.parent_ob: # Per-neuron switch, read by the dispatcher
+            self.parent_ob["animate"] = True
+        if self.skip_unchanged:
+            self.section_runs = self.dataset.section_runs(self.update_tolerance)
+        FRAME_DISPATCHER.add(self)
 
     def remove_voltage_handler(self):
-        raise NotImplementedError
+        '''Stop animating this neuron and free its cached data'''
+        FRAME_DISPATCHER.remove(self.parent_ob)
     
     def reinstantiate_sections_from_childen(self):
-        self.ALL_SECTIONS = [0]*len(self.sections_dicts)
+        for level in self.lod_levels():
+            self.use_level(level)
+            self.ALL_SECTIONS = [0]*self.dataset.n_sections
 
         for child_ob in self.parent_ob.children:
+            if self.use_lod:
+                self.use_level(child_ob.get("lod", "VIEWPORT"))
+            if child_ob.get("merged"):
+                self.MERGED = MergedNeuronMesh(self.segmentation, parent_ob=self.parent_ob)
+                self.MERGED.reattach(child_ob)
+                continue
+
             section_ID = child_ob["ID"]
             X,Y,Z = self.get_branch_coordinates(section_ID)
             DIAM = self.get_branch_diam(section_ID)
@@ -313,13 +882,24 @@ class BlenderNeuron():
                                     type=self.get_branch_type(section_ID),
                                     parent_ob=self.parent_ob, 
                                     with_caps=self.with_caps,
-                                    simplify_soma=self.simplify_soma)
+                                    simplify_soma=self.simplify_soma,
+                                    lod=child_ob.get("lod"))
 
             section.ob = child_ob
+            section.build_vertex_index()
             self.ALL_SECTIONS[section_ID] = section       
 
 ## ------------------------------ OPERATORS -----------------------------------
 
+def update_cache_budget(self, context):
+    DATASET_CACHE.set_budget(int(self.cache_budget*2**20))
+
+@persistent
+def sync_cache_budget(*args):
+    '''Apply the budget saved in the opened file, which does not run the property update'''
+    if bpy.context.scene is not None:
+        update_cache_budget(bpy.context.scene.blenderspiky_neuronbuild, bpy.context)
+
 class NeuronBuilderProps(bpy.types.PropertyGroup):
     '''
         Property group for holding neuron builder parameters
@@ -347,6 +927,129 @@ class NeuronBuilderProps(bpy.types.PropertyGroup):
         default = False
     )
 
+    mesh_method : bpy.props.EnumProperty(
+        name = "Mesh method",
+        items = [
+            ('NUMPY', 'Direct mesh', 'Sweep cross-sections along the sections with NumPy and write the mesh in one batch'),
+            ('CURVES', 'Bezier curves', 'Build Bezier curves and convert them to meshes (slow)'),
+        ],
+        default = 'NUMPY'
+    )
+
+    ring_resolution : bpy.props.IntProperty(
+        name = "Ring resolution",
+        description = "Number of vertices of the cross-section of generated meshes",
+        min = 3,
+        soft_max = 64,
+        default = 12
+    )
+
+    use_lod : bpy.props.BoolProperty(
+        name = "Level of detail",
+        description = "Scale ring resolutions with section diameters, and keep a light proxy for the viewport and a full mesh for rendering",
+        default = False
+    )
+
+    viewport_resolution : bpy.props.IntProperty(
+        name = "Viewport resolution",
+        description = "Ring resolution of the thickest section of the viewport proxy",
+        min = 3,
+        soft_max = 32,
+        default = 6
+    )
+
+    min_ring_resolution : bpy.props.IntProperty(
+        name = "Minimal resolution",
+        description = "Ring resolution of the thinnest sections",
+        min = 3,
+        soft_max = 16,
+        default = 4
+    )
+
+    camera_lod : bpy.props.BoolProperty(
+        name = "Camera based",
+        description = "Also limit the render ring resolutions by the on-screen size of sections, seen from the scene camera",
+        default = False
+    )
+
+    merge_sections : bpy.props.BoolProperty(
+        name = "Single mesh",
+        description = "Build the whole neuron as one mesh (faster playback, sections are told apart by the ID attribute)",
+        default = False
+    )
+
+    voltage_mode : bpy.props.EnumProperty(
+        name = "Voltage animation",
+        items = [
+            ('HANDLER', 'Frame handler', 'Write the Voltage attribute from Python on every frame change'),
+            ('ATLAS', 'Texture atlas', 'Pack all voltages into a float image sampled by the material, no Python per frame'),
+        ],
+        default = 'HANDLER'
+    )
+
+    precompute_frames : bpy.props.BoolProperty(
+        name = "Precompute frames",
+        description = "Compute the vertex voltages of all frames once, instead of on every frame change",
+        default = False
+    )
+
+    skip_unchanged : bpy.props.BoolProperty(
+        name = "Skip unchanged sections",
+        description = "Only write (and redraw) the sections whose voltages changed since the frame shown",
+        default = False
+    )
+
+    update_tolerance : bpy.props.FloatProperty(
+        name = "Tolerance (mV)",
+        description = "Voltage changes smaller than this are not written. 0 skips only exactly constant sections",
+        default = 0.1,
+        min = 0,
+        soft_max = 5
+    )
+
+    voltage_storage : bpy.props.EnumProperty(
+        name = "Voltage storage",
+        description = "How segment voltages are held in memory (and written by the columnar converter). Decoded to float32 per frame",
+        items = [
+            ('FLOAT32', 'Float32', 'Exact'),
+            ('FLOAT16', 'Float16', 'Half the memory, relative error below 0.05%'),
+            ('INT16', 'Int16', 'Half the memory, 65536 levels between the minimum and maximum of each section'),
+        ],
+        default = 'FLOAT32'
+    )
+
+    cull_offscreen : bpy.props.BoolProperty(
+        name = "Cull off-screen sections",
+        description = "While rendering, do not update sections outside of the camera view or smaller than the threshold. "
+                      "Off-screen sections may still show in reflections and shadows. "
+                      "Not applied when motion blur is enabled",
+        default = False
+    )
+
+    cull_min_pixels : bpy.props.FloatProperty(
+        name = "Minimal size (px)",
+        description = "Sections whose bounding box covers fewer pixels are not updated",
+        default = 1.0,
+        min = 0,
+        soft_max = 20
+    )
+
+    cull_margin : bpy.props.FloatProperty(
+        name = "Frustum margin",
+        description = "Relative widening of the camera view, sections just outside of it are still updated",
+        default = 0.1,
+        min = 0,
+        soft_max = 1
+    )
+
+    frame_budget : bpy.props.FloatProperty(
+        name = "Memory budget (MB)",
+        description = "Maximum memory for precomputed frames. Above it, frames are computed on demand and the recent ones are kept",
+        default = 512,
+        min = 1,
+        soft_max = 16384
+    )
+
     downscale_factor : bpy.props.FloatProperty(
         name = "Downscaling factor",
         default = 25
@@ -367,8 +1070,18 @@ class NeuronBuilderProps(bpy.types.PropertyGroup):
         max=1
     )
 
+    cache_budget : bpy.props.FloatProperty(
+        name = "Dataset cache (MB)",
+        description = "Memory for decoded recordings shared between neurons, reloads and graphs in this session",
+        default = DATASET_CACHE.budget_bytes/2**20,
+        min = 0,
+        soft_max = 65536,
+        update = update_cache_budget
+    )
+
     filepath: bpy.props.StringProperty(
         name="Path to .pickle",
+        description="NEURON .pickle, or a columnar .bspk recording (memory mapped, loads only the frames shown)",
         subtype="FILE_PATH"
     )
     
@@ -384,6 +1097,7 @@ class BLENDERSPIKY_OT_NeuronBuilder(bpy.types.Operator):
 
         props = context.scene.blenderspiky_neuronbuild
         graphprops = context.scene.blenderspiky_graphbuild
+        clear_section_tips() # New meshes may reuse the pointers of deleted ones
 
         neuron = BlenderNeuron(
             filepath=props.filepath, 
@@ -393,12 +1107,32 @@ class BLENDERSPIKY_OT_NeuronBuilder(bpy.types.Operator):
             segmentation = props.segmentation,
             DOWNSCALE_FACTOR=props.downscale_factor,
             branch_base_thickness=props.branch_base_thickness,
-            branch_thickness_homogeneity=props.branch_thickness_homogeneity
+            branch_thickness_homogeneity=props.branch_thickness_homogeneity,
+            merge_sections=props.merge_sections,
+            mesh_method=props.mesh_method,
+            ring_resolution=props.ring_resolution,
+            use_lod=props.use_lod,
+            viewport_resolution=props.viewport_resolution,
+            min_ring_resolution=props.min_ring_resolution,
+            camera_lod=props.camera_lod,
+            voltage_mode=props.voltage_mode,
+            precompute_frames=props.precompute_frames,
+            skip_unchanged=props.skip_unchanged,
+            update_tolerance=props.update_tolerance,
+            voltage_storage=props.voltage_storage,
+            cull_offscreen=props.cull_offscreen,
+            cull_min_pixels=props.cull_min_pixels,
+            cull_margin=props.cull_margin,
+            frame_budget=props.frame_budget
             )
         
         neuron.build_branches()
-        neuron.add_voltage_handler()
-        # neuron.set_section_voltage_array()
+        if props.voltage_mode == 'ATLAS':
+            neuron.build_voltage_atlas()
+        else:
+            if props.precompute_frames:
+                neuron.precompute_frame_buffer(props.frame_budget)
+            neuron.add_voltage_handler()
 
         if props.center_at_origin:
             neuron.parent_ob.location[0]=0
@@ -408,3 +1142,22 @@ class BLENDERSPIKY_OT_NeuronBuilder(bpy.types.Operator):
 
         print("Built a neuron from {}".format(props.filepath))
         return {"FINISHED"}
+
+class BLENDERSPIKY_OT_RecordingConverter(bpy.types.Operator):
+    '''
+       Operator to convert the NEURON .pickle into the columnar .bspk format, and use the converted file
+    '''
+    
+    bl_idname = 'blenderspiky.convert_recording'
+    bl_label =  'Convert to columnar (.bspk)'
+
+    def execute(self, context):
+
+        props = context.scene.blenderspiky_neuronbuild
+        if is_columnar(props.filepath):
+            print("{} is already a columnar recording".format(props.filepath))
+            return {"FINISHED"}
+
+        props.filepath = convert_pickle(bpy.path.abspath(props.filepath), storage=props.voltage_storage)
+        print("Converted the recording to {}".format(props.filepath))
+        return {"FINISHED"}
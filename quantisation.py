@@ -0,0 +1,40 @@
+'''
+    Compact voltage storage: float16, or int16 with a per-section scale and offset (value = q*scale + offset).
+    Decoding to float32 happens when frames are read (NeuronDataset.voltage_rows).
+'''
+import numpy as np
+
+STORAGE_DTYPES = {"FLOAT32": np.float32, "FLOAT16": np.float16, "INT16": np.int16}
+
+INT16_LEVELS = 2**16 - 1
+
+def int16_parameters(minima, maxima):
+    '''
+        Per-section (scale, offset) mapping [minimum, maximum] onto the whole int16 range.
+        Constant sections get a scale of 1, so they are stored exactly.
+    '''
+    minima = np.asarray(minima, dtype=np.float64)
+    maxima = np.asarray(maxima, dtype=np.float64)
+    scale = (maxima - minima) / INT16_LEVELS
+    scale = np.where(scale > 0, scale, 1)
+    offset = minima + 2**15*scale
+    return scale.astype(np.float32), offset.astype(np.float32)
+
+def encode(values, storage, scale=None, offset=None):
+    '''Encode float voltages (scale and offset broadcast against the last axis, for INT16)'''
+    values = np.asarray(values, dtype=np.float32)
+    if storage == "INT16":
+        q = np.rint((values - offset) / scale)
+        return np.clip(q, -2**15, 2**15-1).astype(np.int16)
+    return values.astype(STORAGE_DTYPES[storage])
+
+def error_bound(storage, scale=None, max_abs=0.0):
+    '''
+        Upper bound of the absolute decoding error (same unit as the voltages):
+        half a quantisation step for INT16, half a float16 spacing at the largest magnitude for FLOAT16
+    '''
+    if storage == "INT16":
+        return float(np.max(scale)) / 2 if scale is not None and len(scale) else 0.0
+    if storage == "FLOAT16":
+        return float(np.spacing(np.float16(max_abs))) / 2
+    return 0.0
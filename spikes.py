@@ -0,0 +1,111 @@
+'''
+    Spike detection and raster plot geometry (NumPy only).
+
+    Spikes are upward threshold crossings of the section voltages; a crossing closer than a refractory
+    window to the previous spike of its section is ignored. Spike frames of all sections are kept in one
+    compressed array (CSR layout), as the other ragged per-section data of the add-on.
+'''
+import numpy as np
+
+CHUNK_SECTIONS = 256 # Sections scanned at once, bounding the temporary boolean arrays
+
+class SpikeIndex():
+    '''
+        Spike frames of every section.
+            offsets (Nsections+1,) - start of each section in frames
+            frames (Nspikes,) - spike frames, sorted per section
+    '''
+    def __init__(self, offsets, frames):
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.frames = np.asarray(frames, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def n_sections(self):
+        return len(self.offsets) - 1
+
+    @property
+    def counts(self):
+        '''(Nsections,) number of spikes per section'''
+        return np.diff(self.offsets)
+
+    @property
+    def sections(self):
+        '''(Nspikes,) section of every spike'''
+        return np.repeat(np.arange(self.n_sections), self.counts)
+
+    def section(self, section_ID):
+        '''Spike frames of one section'''
+        return self.frames[self.offsets[section_ID]:self.offsets[section_ID+1]]
+
+def detect_spikes(voltages, threshold=0.0, refractory=0):
+    '''
+        SpikeIndex of the upward threshold crossings of (Nsections, Nframes) voltages.
+        A spike is at the first frame at or above the threshold. refractory - minimal number of frames between
+        the spikes of a section (crossings within it are noise on the rising edge).
+    '''
+    sections, frames = [], []
+    for start in range(0, len(voltages), CHUNK_SECTIONS):
+        above = np.asarray(voltages[start:start+CHUNK_SECTIONS]) >= threshold
+        section, frame = np.nonzero(above[:, 1:] & ~above[:, :-1])
+        sections.append(section + start)
+        frames.append(frame + 1)
+    sections = np.concatenate(sections) if sections else np.empty(0, dtype=np.int64)
+    frames = np.concatenate(frames) if frames else np.empty(0, dtype=np.int64)
+
+    if refractory > 0 and len(frames):
+        frames, sections = apply_refractory(frames, sections, refractory)
+
+    offsets = np.zeros(len(voltages)+1, dtype=np.int64)
+    np.cumsum(np.bincount(sections, minlength=len(voltages)), out=offsets[1:])
+    return SpikeIndex(offsets, frames)
+
+def apply_refractory(frames, sections, refractory):
+    '''
+        Drop the spikes closer than `refractory` frames to the previous kept spike of their section
+        (frames sorted per section). Spikes far enough from the previous crossing are kept without looking
+        further back; only chains of close crossings are resolved one by one.
+    '''
+    new_section = np.r_[True, sections[1:] != sections[:-1]]
+    keep = new_section | (np.diff(frames, prepend=0) >= refractory)
+    for i in np.flatnonzero(~keep): # In order, the previous spikes are resolved first
+        j = i - 1
+        while not keep[j]:
+            j -= 1
+        keep[i] = frames[i] - frames[j] >= refractory
+    return frames[keep], sections[keep]
+
+def raster_geometry(spikes, rows, x_scale, row_height, mark_width):
+    '''
+        One quad per spike of the given sections, in the mesh data layout of mesh_builder
+        (co, loop_start, loop_total, loop_vertex) plus the section of every vertex.
+            rows - section IDs of the raster rows, top to bottom
+            x_scale - scene units per frame
+            row_height - distance between rows, marks fill 80% of it
+            mark_width - width of the marks in scene units
+    '''
+    rows = np.asarray(rows, dtype=np.int64)
+    counts = spikes.counts[rows]
+    starts = spikes.offsets[rows]
+    row_of_spike = np.repeat(np.arange(len(rows)), counts)
+    # Position of every spike of the rows in spikes.frames
+    spike = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+
+    x = spikes.frames[spike] * x_scale
+    y = -row_of_spike * row_height
+    n = len(spike)
+
+    co = np.empty((n, 4, 3), dtype=np.float32)
+    co[:, :, 2] = 0
+    co[:, [0, 3], 0] = (x - mark_width/2)[:, None]
+    co[:, [1, 2], 0] = (x + mark_width/2)[:, None]
+    co[:, [0, 1], 1] = y[:, None]
+    co[:, [2, 3], 1] = (y + 0.8*row_height)[:, None]
+
+    loop_start = np.arange(n, dtype=np.int32) * 4
+    loop_total = np.full(n, 4, dtype=np.int32)
+    loop_vertex = np.arange(4*n, dtype=np.int32)
+    vertex_section = np.repeat(rows[row_of_spike], 4).astype(np.int32)
+    return co.ravel(), loop_start, loop_total, loop_vertex, vertex_section
@@ -0,0 +1,65 @@
+'''
+    Min/max pyramids of voltage traces (NumPy only), for plotting long recordings with a bounded number of points.
+
+    Level 0 is the trace itself. Every next level halves the number of bins: a bin keeps the samples of its
+    minimum and maximum, in time order, so spikes stay visible however far the trace is decimated.
+    Levels are built from the previous one, in O(N) time and memory in total.
+'''
+import numpy as np
+
+class TracePyramid():
+    '''
+        Min/max pyramid of one trace.
+            levels - per level, the (Nbins,) sample indices of the bin minima and maxima
+            minimum - minimum of the trace
+    '''
+    def __init__(self, trace):
+        self.trace = np.asarray(trace, dtype=np.float32)
+        self.minimum = float(self.trace.min()) if len(self.trace) else 0.0
+        first = np.arange(len(self.trace), dtype=np.int64)
+        self.levels = [(first, first)]
+        while len(self.levels[-1][0]) > 1:
+            self.levels.append(self._next_level(*self.levels[-1]))
+
+    def _next_level(self, minima, maxima):
+        '''Merge the bins of a level pairwise (an odd last bin is merged with itself)'''
+        if len(minima) % 2:
+            minima = np.append(minima, minima[-1])
+            maxima = np.append(maxima, maxima[-1])
+        a, b = minima[0::2], minima[1::2]
+        minima = np.where(self.trace[a] <= self.trace[b], a, b)
+        a, b = maxima[0::2], maxima[1::2]
+        maxima = np.where(self.trace[a] >= self.trace[b], a, b)
+        return minima, maxima
+
+    def __len__(self):
+        return len(self.levels)
+
+    def n_points(self, level):
+        '''Number of points of a level'''
+        return len(self.trace) if level == 0 else 2*len(self.levels[level][0])
+
+    def indices(self, level):
+        '''Sorted sample indices of the points of a level'''
+        if level == 0:
+            return self.levels[0][0]
+        minima, maxima = self.levels[level]
+        return np.sort(np.stack([minima, maxima], axis=1), axis=1).ravel()
+
+    def points(self, level):
+        '''(sample indices, values) of a level'''
+        indices = self.indices(level)
+        return indices, self.trace[indices]
+
+    def choose_level(self, width, resolution, max_points=0):
+        '''
+            Finest level with at most `resolution` points per unit over a plot `width` units wide
+            (and at most max_points points, if given).
+        '''
+        budget = max(width*resolution, 2)
+        if max_points:
+            budget = min(budget, max_points)
+        for level in range(len(self.levels)):
+            if self.n_points(level) <= budget:
+                return level
+        return len(self.levels) - 1
@@ -1,7 +1,7 @@
 import bpy
 import numpy as np
 import pickle
-from scipy.interpolate import interp1d
+from functools import lru_cache
 
 def _get_make_node_material(mat_name):
     if mat_name in bpy.data.materials:
@@ -40,20 +40,92 @@ def load_sections_dicts(path):
         sections_dicts = pickle.load(f)
     return(sections_dicts)
 
-def linear_interpolation(source_data, n_points):
+@lru_cache(maxsize=256)
+def interpolation_matrix(n_source, n_points):
     '''
-        Linearly resamples an array with n_points
+        (n_source, n_points) weight matrix W of linear resampling: data @ W resamples
+        the last axis of data from n_source to n_points evenly spaced points.
+        Cached per (n_source, n_points) pair, so it is only built once.
     '''
+    W = np.zeros((n_source, n_points))
+    if n_source == 1:
+        W[0] = 1
+    else:
+        position = np.linspace(0, n_source-1, n_points)
+        left = np.minimum(np.floor(position).astype(int), n_source-2)
+        weight = position - left
+        columns = np.arange(n_points)
+        W[left, columns] = 1-weight
+        W[left+1, columns] = weight
+    W.flags.writeable = False
+    return W
 
-    if(len(source_data)==1):
-        return np.ones(n_points)*source_data[0]
-    source_prop = np.linspace(0,1, len(source_data))
-    output_prop = np.linspace(0,1, n_points)
-    interF = interp1d(source_prop, source_data)
-    output= interF(output_prop)
-    
+def resample(block, n_points):
+    '''
+        Linearly resamples the last axis of a (..., n_source) block with n_points in one matmul
+        (e.g. all frames of a section, or all sections of equal length at once)
+    '''
+    block = np.asarray(block, dtype=float)
+    return block @ interpolation_matrix(block.shape[-1], n_points)
+
+def resample_ragged(arrays, n_points):
+    '''
+        Linearly resamples a list of arrays of (possibly) different lengths along their last axis.
+        Arrays of equal length are stacked and resampled together. Returns an (len(arrays), ..., n_points) array
+    '''
+    by_length = {}
+    for k,array in enumerate(arrays):
+        by_length.setdefault(np.shape(array), []).append(k)
+
+    output = None
+    for shape,ks in by_length.items():
+        resampled = resample([arrays[k] for k in ks], n_points)
+        if output is None:
+            output = np.empty((len(arrays),) + resampled.shape[1:])
+        output[ks] = resampled
     return output
+
+def linear_interpolation(source_data, n_points):
+    '''
+        Linearly resamples an array with n_points
+    '''
+    return resample(source_data, n_points)
     
+def read_mesh_data(mesh):
+    '''
+        Read the geometry of a mesh as flat numpy arrays:
+        (co (3*Nverts,), loop_start (Npolys,), loop_total (Npolys,), loop_vertex (Nloops,))
+    '''
+    co = np.empty(len(mesh.vertices)*3, dtype=np.float32)
+    loop_start = np.empty(len(mesh.polygons), dtype=np.int32)
+    loop_total = np.empty(len(mesh.polygons), dtype=np.int32)
+    loop_vertex = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.vertices.foreach_get("co", co)
+    mesh.polygons.foreach_get("loop_start", loop_start)
+    mesh.polygons.foreach_get("loop_total", loop_total)
+    mesh.loops.foreach_get("vertex_index", loop_vertex)
+    return co, loop_start, loop_total, loop_vertex
+
+def write_mesh_data(mesh, co, loop_start, loop_total, loop_vertex, smooth=False):
+    '''
+        Bulk-write geometry (in the layout returned by read_mesh_data) into an empty mesh
+    '''
+    mesh.vertices.add(len(co)//3)
+    mesh.loops.add(len(loop_vertex))
+    mesh.polygons.add(len(loop_start))
+    mesh.vertices.foreach_set("co", co)
+    mesh.loops.foreach_set("vertex_index", loop_vertex)
+    mesh.polygons.foreach_set("loop_start", loop_start)
+    if not bpy.types.MeshPolygon.bl_rna.properties["loop_total"].is_readonly: # Derived from loop_start since Blender 4.0
+        mesh.polygons.foreach_set("loop_total", loop_total)
+    mesh.update(calc_edges=True)
+    if smooth:
+        if hasattr(mesh, "shade_smooth"): # Blender 4.1+
+            mesh.shade_smooth()
+        else:
+            mesh.polygons.foreach_set("use_smooth", np.ones(len(loop_start), dtype=bool))
+    return mesh
+
 def remove_curve(obj_name):
     objs = bpy.data.objects
     
@@ -76,6 +148,12 @@ def remove_curve(obj_name):
     if objs.data.curves.get(curve_name) != None:
         objs.data.curves.remove(objs.data.curves.get(curve_name))
     
+    # Plane and image of a texture graph
+    if bpy.data.meshes.get('mesh_' + obj_name) != None:
+        bpy.data.meshes.remove(bpy.data.meshes.get('mesh_' + obj_name))
+    if bpy.data.images.get('img_' + obj_name) != None:
+        bpy.data.images.remove(bpy.data.images.get('img_' + obj_name))
+    
 
 def ShowMessageBox(message = "", title = "Message Box", icon = 'INFO'):
     '''
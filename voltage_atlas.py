@@ -0,0 +1,75 @@
+import bpy
+import numpy as np
+
+MAX_ATLAS_SIZE = 16384 # Largest image side that GPUs (and Blender) reliably support
+
+## ------------------------------ Voltage atlas layout ---------------------------------------
+
+def atlas_layout(n_columns, n_frames, max_size=MAX_ATLAS_SIZE):
+    '''
+        Layout of a (n_frames x n_columns) voltage table in a float image.
+
+        A frame is stored as rows_per_frame rows of tile_width texels (column c is at x = c % tile_width,
+        row c // tile_width). Frames are stacked upwards into tiles of frames_per_tile frames,
+        and tiles are placed left to right, then bottom to top.
+    '''
+    tile_width = int(min(n_columns, max_size))
+    rows_per_frame = int(np.ceil(n_columns / tile_width))
+    frames_per_tile = int(min(n_frames, max_size // rows_per_frame))
+    n_tiles = int(np.ceil(n_frames / frames_per_tile))
+    tiles_x = int(min(n_tiles, max_size // tile_width))
+    tiles_y = int(np.ceil(n_tiles / tiles_x))
+
+    layout = {
+        "n_columns": int(n_columns),
+        "n_frames": int(n_frames),
+        "tile_width": tile_width,
+        "rows_per_frame": rows_per_frame,
+        "frames_per_tile": frames_per_tile,
+        "tiles_x": tiles_x,
+        "width": tiles_x*tile_width,
+        "height": tiles_y*frames_per_tile*rows_per_frame,
+    }
+    if layout["height"] > max_size:
+        raise ValueError("The recording ({} frames x {} segments) does not fit in a {}px voltage atlas".format(
+                          n_frames, n_columns, max_size))
+    return layout
+
+def pack_atlas(values, layout):
+    '''
+        Pack a (n_frames, n_columns) table into a (height, width) float32 array following the layout
+    '''
+    F, C = layout["n_frames"], layout["n_columns"]
+    W, R = layout["tile_width"], layout["rows_per_frame"]
+    Fpt, tiles_x = layout["frames_per_tile"], layout["tiles_x"]
+    tiles_y = layout["height"] // (Fpt*R)
+
+    padded = np.zeros((tiles_y*tiles_x*Fpt, R*W), dtype=np.float32)
+    padded[:F, :C] = values
+    tiles = padded.reshape(tiles_y, tiles_x, Fpt*R, W)
+    return tiles.transpose(0,2,1,3).reshape(layout["height"], layout["width"])
+
+def atlas_coordinates(columns, layout):
+    '''
+        Static per-vertex atlas coordinates: (x within a tile, row within a frame) of each vertex column
+    '''
+    columns = np.asarray(columns)
+    W = layout["tile_width"]
+    return np.stack([columns % W, columns // W], axis=-1).astype(np.float32)
+
+def create_atlas_image(name, values, layout):
+    '''
+        Create (or replace) a packed, non-color float image holding the voltage table
+    '''
+    if name in bpy.data.images:
+        bpy.data.images.remove(bpy.data.images[name])
+    image = bpy.data.images.new(name, width=layout["width"], height=layout["height"], alpha=False, float_buffer=True)
+    image.colorspace_settings.name = "Non-Color"
+
+    pixels = np.ones((layout["height"], layout["width"], 4), dtype=np.float32)
+    pixels[..., :3] = pack_atlas(values, layout)[..., None] # Voltage in R, G and B
+    image.pixels.foreach_set(pixels.reshape(-1))
+
+    image.file_format = "OPEN_EXR" # Keep full float precision when packed into the .blend
+    image.pack()
+    return image
@@ -0,0 +1,72 @@
+import bpy
+import hashlib
+import numpy as np
+
+BLOB_LIMIT = 16*2**20 # Larger voltage arrays are saved in a sidecar file instead of the .blend
+
+_decoded = {} # (parent pointer, hash) -> decoded (Nsections, Nframes) array
+
+## ------------------------------ Compact voltage_array storage ------------------------------
+
+def _sidecar_path(ob):
+    return bpy.path.abspath(ob["filepath"]) + ".voltage_array.npy"
+
+def store_voltage_array(ob, voltage_array):
+    '''
+        Store the (Nsections, Nframes) mean section voltages on the parent EMPTY in compact form:
+        a packed float32 byte blob, or (above BLOB_LIMIT) a sidecar .npy file referenced by path and hash.
+        Nested IDProperty arrays bloat the .blend, every save and every undo step.
+    '''
+    array = np.ascontiguousarray(np.array(voltage_array, dtype=np.float32))
+    blob = array.tobytes()
+    digest = hashlib.sha1(blob).hexdigest()
+
+    for key in ["voltage_array", "voltage_array_blob", "voltage_array_file"]:
+        if key in ob:
+            del ob[key]
+    ob["voltage_array_shape"] = list(array.shape)
+    ob["voltage_array_hash"] = digest
+
+    if array.nbytes <= BLOB_LIMIT:
+        ob["voltage_array_blob"] = blob
+    else:
+        path = _sidecar_path(ob)
+        np.save(path, array)
+        ob["voltage_array_file"] = path
+
+    array.flags.writeable = False
+    _decoded[(ob.as_pointer(), digest)] = array
+
+def load_voltage_array(ob):
+    '''
+        The (Nsections, Nframes) mean section voltages of a neuron as a read-only float32 array.
+        Decoded once per parent object and stored version.
+    '''
+    if "voltage_array_hash" not in ob: # Files saved before the compact storage
+        return np.array(ob["voltage_array"], dtype=np.float32)
+
+    key = (ob.as_pointer(), ob["voltage_array_hash"])
+    if key in _decoded:
+        return _decoded[key]
+
+    shape = tuple(ob["voltage_array_shape"])
+    if "voltage_array_blob" in ob:
+        array = np.frombuffer(ob["voltage_array_blob"], dtype=np.float32).reshape(shape)
+    else:
+        array = np.load(ob["voltage_array_file"], mmap_mode="r")
+        if hashlib.sha1(np.ascontiguousarray(array).tobytes()).hexdigest() != ob["voltage_array_hash"]:
+            raise ValueError("Sidecar file {} does not match the neuron {}".format(ob["voltage_array_file"], ob.name))
+
+    for stale in [k for k in _decoded if k[0] == key[0]]:
+        del _decoded[stale]
+    _decoded[key] = array
+    return array
+
+def get_section_voltage(ob, section_ID):
+    ''' Mean voltage trace of one section, as a view into the decoded voltage array '''
+    return load_voltage_array(ob)[section_ID]
+
+def release_voltage_array(pointer):
+    ''' Forget the decoded arrays of a parent object (by its pointer), e.g. once it is deleted '''
+    for key in [k for k in _decoded if k[0] == pointer]:
+        del _decoded[key]